@@ -0,0 +1,232 @@
+"""
+Sales Analytics
+Daily rollups behind the admin analytics page, so charts over months of
+orders read a few hundred pre-aggregated rows instead of scanning orders and
+order items.
+
+- sales_daily: orders, units and revenue per day, category and order status.
+  Category '*' holds whole-order totals, so an order spanning two categories
+  is still counted once. Rows are sharded like the dashboard counters.
+- product_sales_daily: units and revenue per day and product, excluding
+  cancelled orders (for the top sellers table).
+
+Both are updated in the same transaction as checkout and order status
+changes, and `flask backfill-analytics` rebuilds them from the source tables
+(e.g. after importing historical orders, or to fold the shards back down).
+"""
+import random
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, insert, literal, select, update
+from sqlalchemy.dialects import mysql, sqlite
+from models import db, Order, OrderItem, Product, SalesDaily, ProductSalesDaily
+from stats import NON_REVENUE_STATUSES
+
+ALL_CATEGORIES = '*'
+
+
+def _upsert_increments(model, key_columns, rows):
+    """Add each row's measures to the existing row with the same key, creating it if needed"""
+    if not rows:
+        return
+    table = model.__table__
+    measures = [column for column in rows[0] if column not in key_columns]
+    dialect = db.session.get_bind(mapper=model).dialect.name
+    if dialect == 'mysql':
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update(
+            {column: table.c[column] + stmt.inserted[column] for column in measures})
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={column: table.c[column] + stmt.excluded[column] for column in measures})
+    else:
+        raise RuntimeError(f'Analytics upserts are not supported on {dialect}')
+    db.session.execute(stmt, sorted(rows, key=lambda row: tuple(row[c] for c in key_columns)))
+
+
+def _category_totals(items):
+    """{category: (units, revenue)} for (category, quantity, price) items, plus the '*' total"""
+    totals = {}
+    for category, quantity, price in items:
+        for key in (category or 'Uncategorized', ALL_CATEGORIES):
+            units, revenue = totals.get(key, (0, 0.0))
+            totals[key] = (units + quantity, revenue + price * quantity)
+    return totals
+
+
+def _add_sales(day, status, totals, sign):
+    shard = random.randrange(current_app.config['STATS_SHARDS'])
+    _upsert_increments(SalesDaily, ('day', 'category', 'status', 'shard'), [
+        {'day': day, 'category': category, 'status': status, 'shard': shard,
+         'orders': sign, 'units': sign * units, 'revenue': sign * revenue}
+        for category, (units, revenue) in totals.items()
+    ])
+
+
+def _add_product_sales(day, items, sign):
+    totals = {}
+    for product_id, quantity, price in items:
+        units, revenue = totals.get(product_id, (0, 0.0))
+        totals[product_id] = (units + quantity, revenue + price * quantity)
+    _upsert_increments(ProductSalesDaily, ('day', 'product_id'), [
+        {'day': day, 'product_id': product_id, 'units': sign * units, 'revenue': sign * revenue}
+        for product_id, (units, revenue) in totals.items()
+    ])
+
+
+def record_sale(order, lines, prices, categories):
+    """
+    Add a new order to the rollups within the checkout transaction.
+
+    `lines` are (product_id, quantity), `prices` maps product_id to the
+    price charged and `categories` product_id to category; products missing
+    from `categories` are looked up.
+    """
+    missing = {product_id for product_id, _ in lines} - set(categories)
+    if missing:
+        categories = dict(categories)
+        categories.update(db.session.query(Product.product_id, Product.category)
+                          .filter(Product.product_id.in_(missing)))
+    day = order.order_date.date()
+    _add_sales(day, order.status, _category_totals(
+        (categories.get(product_id), quantity, prices[product_id]) for product_id, quantity in lines), 1)
+    if order.status not in NON_REVENUE_STATUSES:
+        _add_product_sales(day, [(product_id, quantity, prices[product_id])
+                                 for product_id, quantity in lines], 1)
+
+
+def record_status_change(order, old_status, new_status):
+    """Move an order's rollup contribution from its old status to the new one"""
+    if old_status == new_status:
+        return
+    items = (db.session.query(OrderItem.product_id, Product.category, OrderItem.quantity, OrderItem.price)
+             .outerjoin(Product, Product.product_id == OrderItem.product_id)
+             .filter(OrderItem.order_id == order.order_id).all())
+    day = order.order_date.date()
+    totals = _category_totals((category, quantity, price) for _, category, quantity, price in items)
+    _add_sales(day, old_status, totals, -1)
+    _add_sales(day, new_status, totals, 1)
+    was_revenue = old_status not in NON_REVENUE_STATUSES
+    is_revenue = new_status not in NON_REVENUE_STATUSES
+    if was_revenue != is_revenue:
+        _add_product_sales(day, [(product_id, quantity, price) for product_id, _, quantity, price in items],
+                           1 if is_revenue else -1)
+
+
+def _day_bounds(start, end):
+    """Datetime range [start, end + 1 day) covering the given days"""
+    return (datetime.combine(start, datetime.min.time()),
+            datetime.combine(end + timedelta(days=1), datetime.min.time()))
+
+
+def backfill_analytics(start=None, end=None):
+    """
+    Rebuild the rollups for the days in [start, end] (default: all orders)
+    from orders and order items with INSERT ... SELECT statements, and
+    recount every product's units sold. Returns the number of orders covered.
+    """
+    window = []
+    if start is not None:
+        window.append(Order.order_date >= _day_bounds(start, start)[0])
+    if end is not None:
+        window.append(Order.order_date < _day_bounds(end, end)[1])
+    count = db.session.query(func.count(Order.order_id)).filter(*window).scalar()
+
+    sales, product_sales = SalesDaily.__table__, ProductSalesDaily.__table__
+    for table in (sales, product_sales):
+        stmt = delete(table)
+        if start is not None:
+            stmt = stmt.where(table.c.day >= start)
+        if end is not None:
+            stmt = stmt.where(table.c.day <= end)
+        db.session.execute(stmt)
+
+    day = func.date(Order.order_date)
+    units = func.sum(OrderItem.quantity)
+    revenue = func.sum(OrderItem.quantity * OrderItem.price)
+    joined = (select().select_from(Order).join(OrderItem, OrderItem.order_id == Order.order_id)
+              .outerjoin(Product, Product.product_id == OrderItem.product_id).where(*window))
+
+    category = func.coalesce(Product.category, 'Uncategorized')
+    by_category = joined.with_only_columns(
+        day, category, Order.status, literal(0), func.count(func.distinct(Order.order_id)), units, revenue
+    ).group_by(day, category, Order.status)
+    totals = joined.with_only_columns(
+        day, literal(ALL_CATEGORIES), Order.status, literal(0), func.count(func.distinct(Order.order_id)),
+        units, revenue
+    ).group_by(day, Order.status)
+    columns = ['day', 'category', 'status', 'shard', 'orders', 'units', 'revenue']
+    db.session.execute(insert(sales).from_select(columns, by_category))
+    db.session.execute(insert(sales).from_select(columns, totals))
+
+    per_product = joined.with_only_columns(day, OrderItem.product_id, units, revenue).where(
+        Order.status.notin_(NON_REVENUE_STATUSES)
+    ).group_by(day, OrderItem.product_id)
+    db.session.execute(insert(product_sales).from_select(['day', 'product_id', 'units', 'revenue'],
+                                                         per_product))
+    # Lifetime units behind the listing's popularity sort
+    db.session.execute(update(Product).values(units_sold=(
+        select(func.coalesce(func.sum(OrderItem.quantity), 0))
+        .where(OrderItem.product_id == Product.product_id).scalar_subquery()
+    )).execution_options(synchronize_session=False))
+    db.session.commit()
+    return count
+
+
+def default_range():
+    end = datetime.utcnow().date()  # the rollup days are UTC, like Order.order_date
+    return end - timedelta(days=current_app.config['ANALYTICS_DEFAULT_DAYS'] - 1), end
+
+
+def daily_sales(start, end):
+    """[(day, orders, units, revenue)] for every day in the range, zero-filled, excluding cancelled orders"""
+    rows = (db.session.query(SalesDaily.day, func.sum(SalesDaily.orders),
+                             func.sum(SalesDaily.units), func.sum(SalesDaily.revenue))
+            .filter(SalesDaily.day.between(start, end), SalesDaily.category == ALL_CATEGORIES,
+                    SalesDaily.status.notin_(NON_REVENUE_STATUSES))
+            .group_by(SalesDaily.day).all())
+    by_day = {row[0]: row[1:] for row in rows}
+    days = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        orders, units, revenue = by_day.get(day, (0, 0, 0))
+        days.append((day, int(orders), int(units), round(float(revenue), 2)))
+    return days
+
+
+def sales_by_category(start, end):
+    """[(category, orders, units, revenue)], highest revenue first, excluding cancelled orders"""
+    rows = (db.session.query(SalesDaily.category, func.sum(SalesDaily.orders),
+                             func.sum(SalesDaily.units), func.sum(SalesDaily.revenue))
+            .filter(SalesDaily.day.between(start, end), SalesDaily.category != ALL_CATEGORIES,
+                    SalesDaily.status.notin_(NON_REVENUE_STATUSES))
+            .group_by(SalesDaily.category)
+            .having(func.sum(SalesDaily.orders) > 0)
+            .order_by(func.sum(SalesDaily.revenue).desc()).all())
+    return [(category, int(orders), int(units), round(float(revenue), 2))
+            for category, orders, units, revenue in rows]
+
+
+def orders_by_status(start, end):
+    """{status: (orders, revenue)} for orders placed in the range"""
+    rows = (db.session.query(SalesDaily.status, func.sum(SalesDaily.orders), func.sum(SalesDaily.revenue))
+            .filter(SalesDaily.day.between(start, end), SalesDaily.category == ALL_CATEGORIES)
+            .group_by(SalesDaily.status)
+            .having(func.sum(SalesDaily.orders) > 0).all())
+    return {status: (int(orders), round(float(revenue), 2)) for status, orders, revenue in rows}
+
+
+def top_products(start, end, limit=10):
+    """[(product_id, name, units, revenue)] best sellers by revenue"""
+    revenue = func.sum(ProductSalesDaily.revenue)
+    rows = (db.session.query(ProductSalesDaily.product_id, func.sum(ProductSalesDaily.units), revenue)
+            .filter(ProductSalesDaily.day.between(start, end))
+            .group_by(ProductSalesDaily.product_id)
+            .having(revenue > 0)
+            .order_by(revenue.desc()).limit(limit).all())
+    names = dict(db.session.query(Product.product_id, Product.name)
+                 .filter(Product.product_id.in_([row[0] for row in rows])))
+    return [(product_id, names.get(product_id, f'Deleted product #{product_id}'), int(units),
+             round(float(total), 2)) for product_id, units, total in rows]
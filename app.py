@@ -2,17 +2,42 @@
 Main Flask Application Entry Point
 E-Commerce Website for Food, Flowers, and Heritage Products
 """
+import click
+import os
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
 from models import db
+import assets
+import cart_store
+import db_routing
+import http_cache
+import metrics
+import querycount
+import ratelimit
+import order_events  # registers the outbox handlers publish() fans out to
 from flask_login import LoginManager
-from models import User
+from identity import load_identity
+from cart_summary import get_cart_summary
+from images import responsive_image
+from facets import filter_url
 
 app = Flask(__name__)
 app.config.from_object(Config)
+if app.config['TRUSTED_PROXY_HOPS']:
+    # Client addresses come from X-Forwarded-For as set by our own proxies
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_HOPS'],
+                            x_proto=app.config['TRUSTED_PROXY_HOPS'])
 
 # Initialize database
 db.init_app(app)
+db_routing.init_app(app)
+metrics.init_app(app)
+ratelimit.init_app(app)  # after metrics, ahead of every other request hook
+querycount.init_app(app)
+assets.init_app(app)
+http_cache.init_app(app)
+cart_store.init_app(app)
 
 # Initialize Flask-Login
 login_manager = LoginManager()
@@ -22,7 +47,17 @@ login_manager.login_message = 'Please log in to access this page.'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Served from the identity cache; call .load() for the full User row
+    return load_identity(int(user_id))
+
+@app.context_processor
+def inject_cart_summary():
+    """Expose the cart badge summary lazily, so only pages that show it pay for it"""
+    return {'cart_summary': get_cart_summary}
+
+# A global rather than a context processor so imported template macros can use it
+app.add_template_global(responsive_image)
+app.add_template_global(filter_url)
 
 # Register blueprints
 from routes.auth import auth_bp
@@ -33,6 +68,88 @@ app.register_blueprint(auth_bp)
 app.register_blueprint(user_bp)
 app.register_blueprint(admin_bp)
 
+@app.cli.command('reconcile-stats')
+def reconcile_stats_command():
+    """Recompute dashboard counters from the source tables (run periodically, e.g. from cron)"""
+    from stats import reconcile_stats
+    values = reconcile_stats()
+    for name, value in sorted(values.items()):
+        print(f"{name}: {value}")
+
+@app.cli.command('backfill-analytics')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), help='First day to rebuild (default: all)')
+@click.option('--until', type=click.DateTime(formats=['%Y-%m-%d']), help='Last day to rebuild (default: all)')
+def backfill_analytics_command(since, until):
+    """Rebuild the sales analytics rollups from orders"""
+    from analytics import backfill_analytics
+    count = backfill_analytics(since and since.date(), until and until.date())
+    print(f"Rebuilt analytics from {count} orders")
+
+@app.cli.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension')
+@click.option('--batch-size', type=int, help='Rows per upsert statement')
+def import_products_command(path, fmt, batch_size):
+    """Upsert products from a CSV or JSON Lines file, keyed on SKU"""
+    from product_io import detect_format, import_products, refresh_after_import
+    fmt = fmt or detect_format(path)
+    batch_size = batch_size or app.config['IMPORT_BATCH_SIZE']
+    
+    def report(result):
+        print(f"{result.upserted} rows upserted ({result.error_count} invalid)...")
+    
+    with open(path, newline='', encoding='utf-8') as stream:
+        result = import_products(stream, fmt, batch_size=batch_size, progress=report)
+    refresh_after_import()
+    print(f"Done: {result.processed} rows read, {result.upserted} upserted, {result.error_count} invalid")
+    if app.config['CACHE_BACKEND'] != 'redis':
+        print("Note: running web workers keep their own memory caches and pick up the new catalog "
+              "as they expire; restart them to see it at once")
+    for error in result.errors:
+        print(f"  {error}")
+
+
+@app.cli.command('export-products')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension')
+def export_products_command(path, fmt):
+    """Stream the product catalog to a CSV or JSON Lines file"""
+    from product_io import detect_format, export_products
+    with open(path, 'w', newline='', encoding='utf-8') as stream:
+        for chunk in export_products(fmt or detect_format(path)):
+            stream.write(chunk)
+    print(f"Exported products to {path}")
+
+
+@app.cli.command('generate-image-variants')
+def generate_image_variants_command():
+    """Create thumbnails and WebP copies for uploads that don't have them yet"""
+    from images import make_variants, uploads_missing_variants
+    paths = uploads_missing_variants()
+    for path in paths:
+        make_variants(path, app.config['IMAGE_WIDTHS'], app.config['IMAGE_QUALITY'])
+        print(f"  {os.path.basename(path)}")
+    print(f"Generated variants for {len(paths)} uploads")
+
+
+@app.cli.command('outbox-worker')
+@click.option('--once', is_flag=True, help='Exit when no events are due instead of polling')
+def outbox_worker_command(once):
+    """Run post-commit side effects from the outbox table with retries"""
+    from outbox import run_worker
+    run_worker(once=once)
+
+
+@app.cli.command('build-assets')
+@click.option('--vendor', is_flag=True, help='Download Bootstrap, Font Awesome and Chart.js into static/vendor first')
+def build_assets_command(vendor):
+    """Fingerprint, minify and precompress static files into static/dist"""
+    if vendor:
+        print("Downloading vendor assets...")
+        assets.download_vendor_assets(app.static_folder)
+    manifest = assets.build_assets(app.static_folder)
+    print(f"Built {len(manifest)} assets; restart the app to serve them")
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
@@ -0,0 +1,208 @@
+"""
+Static Assets
+Builds fingerprinted, minified and precompressed copies of the files under
+static/ and serves them with far-future immutable cache headers.
+
+`flask build-assets` writes every asset to static/dist/ under a name that
+includes a hash of its content, plus .gz/.br siblings and a manifest.json;
+`--vendor` first downloads the pinned Bootstrap, Font Awesome and Chart.js
+releases into static/vendor/ so pages no longer depend on third-party CDNs. Once a
+manifest exists, url_for('static', filename=...) transparently points at
+the hashed copy, so templates don't change.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import urllib.request
+from flask import current_app, request, send_from_directory, url_for
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.ttf')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# (path under static/, CDN URL); templates fall back to the URL until vendored
+BOOTSTRAP = 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist'
+FONT_AWESOME = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0'
+CHART_JS = 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist'
+VENDOR_ASSETS = {
+    'bootstrap.css': ('vendor/bootstrap/css/bootstrap.min.css', f'{BOOTSTRAP}/css/bootstrap.min.css'),
+    'bootstrap.js': ('vendor/bootstrap/js/bootstrap.bundle.min.js', f'{BOOTSTRAP}/js/bootstrap.bundle.min.js'),
+    'fontawesome.css': ('vendor/fontawesome/css/all.min.css', f'{FONT_AWESOME}/css/all.min.css'),
+    'chart.js': ('vendor/chartjs/chart.umd.min.js', f'{CHART_JS}/chart.umd.min.js'),
+}
+# Files a vendored stylesheet loads relative to itself
+VENDOR_DEPENDENCIES = [
+    (f'vendor/fontawesome/webfonts/{name}.{ext}', f'{FONT_AWESOME}/webfonts/{name}.{ext}')
+    for name in ('fa-brands-400', 'fa-regular-400', 'fa-solid-900', 'fa-v4compatibility')
+    for ext in ('woff2', 'ttf')
+]
+
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def download_vendor_assets(static_folder, log=print):
+    """Fetch the pinned third-party assets into static/vendor/"""
+    targets = [entry for entry in VENDOR_ASSETS.values()] + VENDOR_DEPENDENCIES
+    for path, url in targets:
+        destination = os.path.join(static_folder, path)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response, open(destination, 'wb') as stream:
+            shutil.copyfileobj(response, stream)
+        log(f"  {path}")
+
+
+def _fingerprinted(path, content):
+    root, ext = os.path.splitext(path)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def _minify(path, content):
+    """Minify first-party CSS/JS; vendored files already ship minified"""
+    if path.startswith('vendor/') or '.min.' in path:
+        return content
+    if path.endswith('.css'):
+        import rcssmin
+        return rcssmin.cssmin(content.decode('utf-8')).encode('utf-8')
+    if path.endswith('.js'):
+        import rjsmin
+        return rjsmin.jsmin(content.decode('utf-8')).encode('utf-8')
+    return content
+
+
+def _rewrite_css_urls(path, content, manifest):
+    """Point url(...) references in a stylesheet at their fingerprinted names"""
+    directory = os.path.dirname(path)
+
+    def replace(match):
+        quote, target = match.groups()
+        clean, suffix = re.match(r'([^?#]*)(.*)', target).groups()
+        if not clean or re.match(r'^(?:[a-z]+:|/|#)', clean):
+            return match.group(0)
+        logical = os.path.normpath(os.path.join(directory, clean)).replace(os.sep, '/')
+        if logical not in manifest:
+            return match.group(0)
+        relative = os.path.relpath(manifest[logical], DIST_DIR + '/' + directory if directory else DIST_DIR)
+        return f'url({quote}{relative.replace(os.sep, "/")}{suffix}{quote})'
+    return _CSS_URL.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def build_assets(static_folder, log=print):
+    """
+    Write fingerprinted copies of static/ into static/dist/ and return the manifest.
+
+    Uploads are skipped (they're content-hashed already). Stylesheets are
+    processed last so the fonts and images they reference are already in the
+    manifest and can be rewritten to their hashed names.
+    """
+    import brotli
+
+    dist = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+    upload_dir = os.path.relpath(os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER']),
+                                 static_folder).replace(os.sep, '/')
+
+    sources = []
+    for directory, dirnames, filenames in os.walk(static_folder):
+        relative_dir = os.path.relpath(directory, static_folder).replace(os.sep, '/')
+        if relative_dir in (DIST_DIR, upload_dir):
+            dirnames.clear()
+            continue
+        for filename in filenames:
+            if not filename.startswith('.'):
+                sources.append(os.path.normpath(os.path.join(relative_dir, filename)).replace(os.sep, '/'))
+    sources.sort(key=lambda path: (path.endswith('.css'), path))
+
+    manifest = {}
+    for path in sources:
+        with open(os.path.join(static_folder, path), 'rb') as stream:
+            content = _minify(path, stream.read())
+        if path.endswith('.css'):
+            content = _rewrite_css_urls(path, content, manifest)
+        hashed = f'{DIST_DIR}/{_fingerprinted(path, content)}'
+        destination = os.path.join(static_folder, hashed)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        with open(destination, 'wb') as stream:
+            stream.write(content)
+        if path.endswith(COMPRESSIBLE):
+            with open(destination + '.gz', 'wb') as stream:
+                stream.write(gzip.compress(content, compresslevel=9, mtime=0))
+            with open(destination + '.br', 'wb') as stream:
+                stream.write(brotli.compress(content, quality=11))
+        manifest[path] = hashed
+        log(f"  {path} -> {hashed}")
+
+    with open(os.path.join(dist, MANIFEST), 'w') as stream:
+        json.dump(manifest, stream, indent=1, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as stream:
+            return json.load(stream)
+    except (OSError, ValueError):
+        return {}
+
+
+def vendor_url(name):
+    """Local URL of a vendored asset if it has been downloaded, else its CDN URL"""
+    path, cdn_url = VENDOR_ASSETS[name]
+    if os.path.exists(os.path.join(current_app.static_folder, path)):
+        return url_for('static', filename=path)
+    return cdn_url
+
+
+def _is_immutable(filename):
+    upload_prefix = current_app.extensions['static_assets']['upload_prefix']
+    return filename.startswith(DIST_DIR + '/') or filename.startswith(upload_prefix)
+
+
+def serve_static(filename):
+    """
+    Static file view that prefers precompressed .br/.gz siblings and marks
+    content-addressed files (dist/ and uploads) immutable.
+    """
+    static_folder = current_app.static_folder
+    immutable = _is_immutable(filename)
+    max_age = IMMUTABLE_MAX_AGE if immutable else None
+    accepted = request.accept_encodings
+
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if filename.startswith(DIST_DIR + '/') and accepted[encoding] and \
+                os.path.isfile(os.path.join(static_folder, filename + suffix)):
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response = send_from_directory(static_folder, filename + suffix, max_age=max_age, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(static_folder, filename, max_age=max_age)
+    if filename.startswith(DIST_DIR + '/'):
+        response.vary.add('Accept-Encoding')
+    if immutable:
+        response.cache_control.immutable = True
+        response.cache_control.public = True
+    return response
+
+
+def init_app(app):
+    """Serve static files through serve_static and rewrite URLs to fingerprinted names"""
+    upload_dir = os.path.relpath(os.path.join(app.root_path, app.config['UPLOAD_FOLDER']),
+                                 app.static_folder).replace(os.sep, '/')
+    state = app.extensions['static_assets'] = {
+        'manifest': {} if app.debug else load_manifest(app.static_folder),
+        'upload_prefix': upload_dir + '/',
+    }
+    app.view_functions['static'] = serve_static
+    app.add_template_global(vendor_url)
+
+    @app.url_defaults
+    def fingerprint_static_url(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            hashed = state['manifest'].get(values['filename'])
+            if hashed:
+                values['filename'] = hashed
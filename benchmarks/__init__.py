@@ -0,0 +1,5 @@
+"""
+Benchmarks
+Offline performance benchmarks that run the application against SQLite.
+Run them as modules from the project root, e.g. `python -m benchmarks.login_storm`.
+"""
@@ -0,0 +1,73 @@
+"""
+Bulk Import Benchmark
+Generates a synthetic supplier catalog, imports it into SQLite through the
+streaming importer, re-imports it (the update path of the upsert) and exports
+it again, reporting throughput and peak memory for each phase.
+
+    python -m benchmarks.bulk_import --rows 1000000
+"""
+import argparse
+import csv
+import os
+import random
+import resource
+import tempfile
+import time
+from benchmarks.common import load_app
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (Linux reports KiB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_catalog(path, rows, seed=42):
+    rng = random.Random(seed)
+    categories = ('food', 'flowers', 'heritage')
+    with open(path, 'w', newline='', encoding='utf-8') as stream:
+        writer = csv.writer(stream)
+        writer.writerow(['sku', 'name', 'category', 'price', 'description', 'image', 'stock'])
+        for i in range(rows):
+            writer.writerow([f'SKU-{i:08d}', f'Synthetic product {i}', rng.choice(categories),
+                             f'{rng.uniform(1, 500):.2f}', f'Description for synthetic product {i}',
+                             '', rng.randint(0, 500)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='ecommerce-import-')
+    source = os.path.join(workdir, 'catalog.csv')
+    export = os.path.join(workdir, 'export.csv')
+
+    started = time.perf_counter()
+    write_catalog(source, args.rows)
+    print(f"generated {args.rows} rows ({os.path.getsize(source) / 1e6:.1f} MB) "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    app = load_app(os.path.join(workdir, 'bench.db'))
+    import product_io
+
+    with app.app_context():
+        for phase in ('insert', 'update'):
+            started = time.perf_counter()
+            with open(source, newline='', encoding='utf-8') as stream:
+                result = product_io.import_products(stream, 'csv', batch_size=args.batch_size)
+            elapsed = time.perf_counter() - started
+            print(f"{phase}: {result.upserted} rows in {elapsed:.1f}s "
+                  f"({result.upserted / elapsed:,.0f} rows/s), peak RSS {peak_rss_mb():.0f} MB")
+
+        started = time.perf_counter()
+        with open(export, 'w', newline='', encoding='utf-8') as stream:
+            for chunk in product_io.export_products('csv'):
+                stream.write(chunk)
+        elapsed = time.perf_counter() - started
+        print(f"export: {args.rows} rows in {elapsed:.1f}s "
+              f"({args.rows / elapsed:,.0f} rows/s), peak RSS {peak_rss_mb():.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
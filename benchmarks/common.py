@@ -0,0 +1,54 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+import os
+import tempfile
+
+
+def load_app(database_path=None, **config_env):
+    """
+    Import the application configured for a local SQLite database.
+
+    Config is read from the environment at import time, so this must run
+    before anything else imports `app`. Every test client request comes from
+    127.0.0.1, so rate limiting and load shedding are off unless the caller
+    turns them back on.
+    """
+    config_env.setdefault('RATELIMIT_ENABLED', 'false')
+    config_env.setdefault('LOAD_SHED_ENABLED', 'false')
+    if database_path is None:
+        database_path = os.path.join(tempfile.mkdtemp(prefix='ecommerce-bench-'), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(database_path)}'
+    for key, value in config_env.items():
+        os.environ[key] = str(value)
+    from app import app
+    from models import db
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def protection_env(enabled):
+    """load_app() settings for a benchmark's --protection flag"""
+    value = 'true' if enabled else 'false'
+    return {'RATELIMIT_ENABLED': value, 'LOAD_SHED_ENABLED': value}
+
+
+# Responses from the rate limiter and load shedder, reported apart from real failures
+REJECTED_STATUSES = (429, 503)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def format_latency(samples):
+    """One-line p50/p99/max summary in milliseconds"""
+    return (f"p50={percentile(samples, 50) * 1000:.1f}ms "
+            f"p99={percentile(samples, 99) * 1000:.1f}ms "
+            f"max={max(samples, default=0) * 1000:.1f}ms")
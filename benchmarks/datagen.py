@@ -0,0 +1,146 @@
+"""
+Synthetic Data Generator
+Fills a database with users, products, carts and orders at a chosen scale.
+Product popularity follows a Zipf distribution and order volume is skewed
+towards a minority of heavy customers, so hot rows and long order histories
+look like production rather than uniform noise.
+
+    python -m benchmarks.datagen --database bench.db --scale 10
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+
+# Every generated customer shares this password; its hash is computed once
+PASSWORD = 'benchmark'
+PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+
+CATEGORIES = ('food', 'flowers', 'heritage')
+STATUSES = ('pending', 'confirmed', 'delivered', 'cancelled')
+STATUS_WEIGHTS = (15, 20, 60, 5)
+WORDS = ('classic', 'fresh', 'handmade', 'organic', 'royal', 'spicy', 'golden', 'silk', 'rose',
+         'lily', 'cake', 'pizza', 'biryani', 'bouquet', 'vase', 'scarf', 'pottery', 'brass',
+         'wooden', 'tulip', 'orchid', 'chocolate', 'salad', 'sushi', 'lantern', 'basket')
+
+BATCH_SIZE = 5000
+
+
+def sizes_for(scale):
+    """Row counts for a given scale factor"""
+    return {
+        'users': 1000 * scale,
+        'products': 500 * scale,
+        'orders': 5000 * scale,
+        'cart_users': 200 * scale,
+    }
+
+
+def zipf_weights(n, s=1.1):
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def _insert_batches(db, table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            db.session.execute(insert(table), batch)
+            batch.clear()
+    if batch:
+        db.session.execute(insert(table), batch)
+    db.session.commit()
+
+
+def generate(app, scale=1, seed=42, log=print):
+    """Populate the app's database and return the row counts that were generated"""
+    from werkzeug.security import generate_password_hash
+    from models import db, User, Product, Cart, Order, OrderItem
+    from stats import reconcile_stats
+    from analytics import backfill_analytics
+
+    rng = random.Random(seed)
+    sizes = sizes_for(scale)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    with app.app_context():
+        db.create_all()
+        password = generate_password_hash(PASSWORD, PASSWORD_HASH_METHOD)
+
+        users = [{'name': f'Customer {i}', 'email': f'customer{i}@bench.example', 'password': password,
+                  'role': 'customer', 'created_at': now - timedelta(days=rng.uniform(0, 730))}
+                 for i in range(sizes['users'])]
+        users.append({'name': 'Bench Admin', 'email': 'admin@bench.example', 'password': password,
+                      'role': 'admin', 'created_at': now})
+        _insert_batches(db, User.__table__, users)
+        user_ids = [row[0] for row in db.session.query(User.user_id).filter(User.role == 'customer')]
+        log(f"users: {len(user_ids)}")
+
+        def product_rows():
+            for i in range(sizes['products']):
+                name = ' '.join(rng.sample(WORDS, 3)).title()
+                yield {'sku': f'BENCH-{i:08d}', 'name': f'{name} {i}',
+                       'category': rng.choice(CATEGORIES),
+                       'price': round(rng.lognormvariate(3.3, 0.8), 2),
+                       'description': ' '.join(rng.choices(WORDS, k=20)),
+                       'image': None, 'stock': 1_000_000,
+                       'created_at': now - timedelta(days=rng.uniform(0, 365))}
+        _insert_batches(db, Product.__table__, product_rows())
+        products = db.session.query(Product.product_id, Product.price).all()
+        product_ids = [row.product_id for row in products]
+        prices = dict(products)
+        popularity = zipf_weights(len(product_ids))
+        log(f"products: {len(product_ids)}")
+
+        # A fifth of customers place most of the orders
+        customer_weights = zipf_weights(len(user_ids), s=0.8)
+        order_users = rng.choices(user_ids, weights=customer_weights, k=sizes['orders'])
+        order_rows, item_rows = [], []
+        next_order_id = (db.session.query(db.func.max(Order.order_id)).scalar() or 0) + 1
+        for order_id, user_id in enumerate(order_users, start=next_order_id):
+            lines = {}
+            for product_id in rng.choices(product_ids, weights=popularity, k=rng.randint(1, 5)):
+                lines[product_id] = lines.get(product_id, 0) + rng.randint(1, 3)
+            total = sum(prices[product_id] * quantity for product_id, quantity in lines.items())
+            order_rows.append({'order_id': order_id, 'user_id': user_id, 'total_amount': round(total, 2),
+                               'order_date': now - timedelta(days=rng.uniform(0, 365)),
+                               'status': rng.choices(STATUSES, weights=STATUS_WEIGHTS)[0],
+                               'payment_method': rng.choice(('cash_on_delivery', 'online_payment')),
+                               'shipping_address': f'{order_id} Benchmark Street', 'phone': '5550100'})
+            item_rows.extend({'order_id': order_id, 'product_id': product_id, 'quantity': quantity,
+                              'price': prices[product_id]} for product_id, quantity in lines.items())
+        _insert_batches(db, Order.__table__, order_rows)
+        _insert_batches(db, OrderItem.__table__, item_rows)
+        log(f"orders: {len(order_rows)} ({len(item_rows)} items)")
+
+        cart_rows = []
+        for user_id in rng.sample(user_ids, min(sizes['cart_users'], len(user_ids))):
+            for product_id in set(rng.choices(product_ids, weights=popularity, k=rng.randint(1, 6))):
+                cart_rows.append({'user_id': user_id, 'product_id': product_id,
+                                  'quantity': rng.randint(1, 3), 'created_at': now})
+        _insert_batches(db, Cart.__table__, cart_rows)
+        log(f"cart lines: {len(cart_rows)}")
+
+        reconcile_stats()
+        backfill_analytics()
+
+    log(f"generated in {time.perf_counter() - started:.1f}s")
+    return {'users': len(user_ids), 'products': len(product_ids),
+            'orders': len(order_rows), 'order_items': len(item_rows), 'cart_lines': len(cart_rows)}
+
+
+def main():
+    from benchmarks.common import load_app
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', required=True, help='SQLite file to create or extend')
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    generate(load_app(args.database), scale=args.scale, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Load Benchmark
+Replays a weighted mix of storefront and admin traffic against the app and
+reports throughput, latency percentiles and SQL queries per request for each
+scenario.
+
+By default requests go through the Flask test client in this process against
+a freshly generated SQLite database, which also lets every request's queries
+be counted. With --url the same workload is sent over HTTP to a running
+server (e.g. gunicorn started on a database made with benchmarks.datagen).
+
+    python -m benchmarks.load --scale 1 --duration 30 --threads 8
+    python -m benchmarks.load --url http://127.0.0.1:8000 --users 1000 --duration 30
+
+Rate limiting and load shedding are off in-process (all clients share one
+IP) unless --protection is given; 429 and 503 responses are counted as
+rejected rather than as errors.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from benchmarks.common import REJECTED_STATUSES, load_app, percentile, protection_env
+from benchmarks.datagen import PASSWORD, PASSWORD_HASH_METHOD, WORDS, sizes_for
+from querycount import QueryCounter
+
+# (scenario, weight, needs an admin session)
+SCENARIOS = [
+    ('home', 30, False),
+    ('search', 20, False),
+    ('product_detail', 20, False),
+    ('add_to_cart', 10, False),
+    ('checkout', 3, False),
+    ('my_orders', 7, False),
+    ('admin_dashboard', 4, True),
+    ('admin_orders', 3, True),
+    ('admin_products', 3, True),
+]
+
+
+class HttpClient:
+    """Minimal session-keeping HTTP client with the test client's get/post shape"""
+
+    class Response:
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect())
+
+    def _open(self, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(self.base_url + path, data=body) as response:
+                response.read()
+                return self.Response(response.status)
+        except urllib.error.HTTPError as e:
+            return self.Response(e.code)
+
+    def get(self, path):
+        return self._open(path)
+
+    def post(self, path, data):
+        return self._open(path, data)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects as responses, like the Flask test client does"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def run_scenario(name, client, rng, product_count):
+    product_id = rng.randint(1, product_count)
+    if name == 'home':
+        return client.get('/')
+    if name == 'search':
+        return client.get('/products?' + urllib.parse.urlencode({'search': ' '.join(rng.sample(WORDS, 2))}))
+    if name == 'product_detail':
+        return client.get(f'/product/{product_id}')
+    if name == 'add_to_cart':
+        return client.post('/add-to-cart', data={'product_id': product_id, 'quantity': 1})
+    if name == 'checkout':
+        client.post('/add-to-cart', data={'product_id': product_id, 'quantity': 1})
+        return client.post('/checkout', data={'payment_method': 'cash_on_delivery',
+                                              'shipping_address': '1 Load Test Lane', 'phone': '5550100'})
+    if name == 'my_orders':
+        return client.get('/my-orders')
+    if name == 'admin_dashboard':
+        return client.get('/admin/dashboard')
+    if name == 'admin_orders':
+        return client.get('/admin/orders')
+    if name == 'admin_products':
+        return client.get('/admin/products')
+    raise ValueError(f'unknown scenario {name}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='benchmark a running server instead of the in-process app')
+    parser.add_argument('--database', help='existing SQLite database (default: generate a fresh one)')
+    parser.add_argument('--scale', type=int, default=1, help='datagen scale when generating')
+    parser.add_argument('--users', type=int, help='customer count in an existing dataset')
+    parser.add_argument('--products', type=int, help='product count in an existing dataset')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', dest='json_path', help='also write the results to this JSON file')
+    parser.add_argument('--protection', action='store_true',
+                        help='keep rate limiting and load shedding on for the in-process app')
+    args = parser.parse_args()
+
+    sizes = sizes_for(args.scale)
+    user_count = args.users or sizes['users']
+    product_count = args.products or sizes['products']
+    count_queries = not args.url
+
+    if args.url:
+        def make_client():
+            return HttpClient(args.url)
+    else:
+        database = args.database
+        generate_data = database is None or not os.path.exists(database)
+        if database is None:
+            database = os.path.join(tempfile.mkdtemp(prefix='ecommerce-load-'), 'bench.db')
+        app = load_app(database, PASSWORD_HASH_METHOD=PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS=0,
+                       **protection_env(args.protection))
+        if generate_data:
+            from benchmarks.datagen import generate
+            generate(app, scale=args.scale)
+        make_client = app.test_client
+
+    names = [name for name, _, _ in SCENARIOS]
+    weights = [weight for _, weight, _ in SCENARIOS]
+    admin_only = {name for name, _, admin in SCENARIOS if admin}
+    results = {name: {'latencies': [], 'queries': [], 'errors': 0, 'rejected': 0} for name in names}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def worker(index):
+        rng = random.Random(args.seed + index)
+        customer = make_client()
+        customer.post('/login', data={'email': f'customer{rng.randrange(user_count)}@bench.example',
+                                      'password': PASSWORD})
+        admin = make_client()
+        admin.post('/login', data={'email': 'admin@bench.example', 'password': PASSWORD})
+        while not stop.is_set():
+            name = rng.choices(names, weights=weights)[0]
+            client = admin if name in admin_only else customer
+            started = time.perf_counter()
+            with QueryCounter() as queries:
+                response = run_scenario(name, client, rng, product_count)
+            elapsed = time.perf_counter() - started
+            with lock:
+                result = results[name]
+                result['latencies'].append(elapsed)
+                if count_queries:
+                    result['queries'].append(queries.count)
+                if response.status_code in REJECTED_STATUSES:
+                    result['rejected'] += 1
+                elif response.status_code >= 400:
+                    result['errors'] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    report = {}
+    print(f"{'scenario':<16}{'requests':>9}{'errors':>8}{'rejected':>9}{'req/s':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+    for name in names:
+        result = results[name]
+        latencies = result['latencies']
+        queries = sum(result['queries']) / len(result['queries']) if result['queries'] else None
+        report[name] = {
+            'requests': len(latencies),
+            'errors': result['errors'],
+            'rejected': result['rejected'],
+            'rps': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'queries_per_request': queries,
+        }
+        row = report[name]
+        print(f"{name:<16}{row['requests']:>9}{row['errors']:>8}{row['rejected']:>9}{row['rps']:>9.1f}"
+              f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+              f"{queries if queries is not None else float('nan'):>9.1f}")
+    total = sum(row['requests'] for row in report.values())
+    print(f"total: {total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as stream:
+            json.dump({'duration': elapsed, 'threads': args.threads, 'scenarios': report}, stream, indent=2)
+
+
+if __name__ == '__main__':
+    main()
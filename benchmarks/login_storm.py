@@ -0,0 +1,83 @@
+"""
+Login Storm Benchmark
+Hammers /login from several threads while other threads browse the homepage,
+and reports login throughput plus the latency of the unrelated page views.
+
+Compare hashing in the request thread against the process pool:
+    python -m benchmarks.login_storm --hash-workers 0
+    python -m benchmarks.login_storm --hash-workers 4
+
+All logins come from one IP, so rate limiting and load shedding are off
+unless --protection is given; 429 and 503 responses are reported as
+rejected, separately from failed logins.
+"""
+import argparse
+import threading
+import time
+from benchmarks.common import REJECTED_STATUSES, load_app, format_latency, protection_env
+
+EMAIL = 'storm@example.com'
+PASSWORD = 'storm-password'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to run')
+    parser.add_argument('--login-threads', type=int, default=8)
+    parser.add_argument('--page-threads', type=int, default=2)
+    parser.add_argument('--hash-workers', type=int, default=2, help='PASSWORD_HASH_WORKERS (0 = inline)')
+    parser.add_argument('--hash-method', default='scrypt', help='PASSWORD_HASH_METHOD')
+    parser.add_argument('--protection', action='store_true', help='keep rate limiting and load shedding on')
+    args = parser.parse_args()
+
+    app = load_app(PASSWORD_HASH_WORKERS=args.hash_workers, PASSWORD_HASH_METHOD=args.hash_method,
+                   **protection_env(args.protection))
+    from models import db, User
+    with app.app_context():
+        user = User(name='Storm', email=EMAIL, role='customer')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        # Warm the hashing pool and the catalog cache before timing anything
+        user.check_password(PASSWORD)
+    app.test_client().get('/')
+
+    stop = threading.Event()
+    login_latencies, page_latencies, failures, rejected = [], [], [], []
+
+    def storm():
+        while not stop.is_set():
+            client = app.test_client()
+            started = time.perf_counter()
+            response = client.post('/login', data={'email': EMAIL, 'password': PASSWORD})
+            login_latencies.append(time.perf_counter() - started)
+            if response.status_code in REJECTED_STATUSES:
+                rejected.append(response.status_code)
+            elif response.status_code != 302:
+                failures.append(response.status_code)
+
+    def browse():
+        client = app.test_client()
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get('/')
+            page_latencies.append(time.perf_counter() - started)
+
+    threads = ([threading.Thread(target=storm) for _ in range(args.login_threads)] +
+               [threading.Thread(target=browse) for _ in range(args.page_threads)])
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"hash method: {args.hash_method}, hash workers: {args.hash_workers}")
+    print(f"logins: {len(login_latencies)} ({len(login_latencies) / args.duration:.1f}/s), "
+          f"failed: {len(failures)}, rejected (429/503): {len(rejected)}")
+    print(f"login latency: {format_latency(login_latencies)}")
+    print(f"homepage: {len(page_latencies)} requests, latency: {format_latency(page_latencies)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Query Budget Check
+Asserts that the cart and checkout views issue a bounded number of SQL
+statements whatever the size of the cart, using querycount's
+assert_view_query_budget(). Each view is measured right after the cart
+changes (pending write-behind changes are flushed on the way) and again
+once it is settled. Exits non-zero if a view goes over its budget.
+
+    python -m benchmarks.query_budgets
+"""
+import argparse
+import sys
+from benchmarks.common import load_app
+from benchmarks.datagen import PASSWORD, PASSWORD_HASH_METHOD
+from querycount import QueryCounter, assert_view_query_budget
+
+EMAIL = 'budget@example.com'
+
+# (view, path, statements allowed)
+BUDGETS = [
+    ('cart', '/cart', 3),
+    ('cart api', '/api/cart', 3),
+    ('checkout', '/checkout', 5),
+]
+
+
+def fill_cart(client, size):
+    """Replace the cart with `size` products, then leave one change pending in the session"""
+    batches = [[{'op': 'clear'}] + [{'op': 'add', 'product_id': product_id, 'quantity': 1}
+                                     for product_id in range(1, size + 1)],
+               [{'op': 'set', 'product_id': 1, 'quantity': 2}]]
+    for operations in batches:
+        response = client.post('/api/cart', json={'operations': operations})
+        if response.status_code != 200:
+            raise RuntimeError(f'filling the cart failed: {response.status_code} {response.get_data(as_text=True)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 40], help='cart sizes to check')
+    args = parser.parse_args()
+
+    app = load_app(PASSWORD_HASH_METHOD=PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS=0)
+    from models import db, Product, User
+    with app.app_context():
+        db.session.add_all([Product(name=f'Budget product {i}', category='food', price=9.99, stock=1000)
+                            for i in range(max(args.sizes))])
+        user = User(name='Budget', email=EMAIL, role='customer')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+    client = app.test_client()
+    client.post('/login', data={'email': EMAIL, 'password': PASSWORD})
+
+    failures = 0
+    print(f"{'view':<10}{'cart size':>10}{'after change':>14}{'settled':>9}{'budget':>8}")
+    for size in args.sizes:
+        for name, path, budget in BUDGETS:
+            fill_cart(client, size)
+            counts = []
+            for _ in ('after change', 'settled'):
+                try:
+                    with QueryCounter() as queries:
+                        response = assert_view_query_budget(client, path, budget)
+                    if response.status_code != 200:
+                        raise AssertionError(f'{path} returned {response.status_code}')
+                    counts.append(str(queries.count))
+                except AssertionError as e:
+                    failures += 1
+                    counts.append('FAIL')
+                    print(f'{name} with {size} products: {e}', file=sys.stderr)
+            print(f"{name:<10}{size:>10}{counts[0]:>14}{counts[1]:>9}{budget:>8}")
+    if failures:
+        print(f'{failures} budget check(s) failed', file=sys.stderr)
+        sys.exit(1)
+    print('all views within budget')
+
+
+if __name__ == '__main__':
+    main()
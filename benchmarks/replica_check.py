@@ -0,0 +1,55 @@
+"""
+Replica Routing Check
+Gives a read replica older data than the primary and checks that pages and
+products stored in the shared caches are rendered from the primary, while
+the view's other reads may still use the replica. Exits non-zero if a cache
+fill shows the replica's data.
+
+    python -m benchmarks.replica_check
+"""
+import os
+import shutil
+import sys
+import tempfile
+from benchmarks.common import load_app
+
+PRIMARY_NAME = 'Primary name'
+REPLICA_NAME = 'Stale replica name'
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='ecommerce-replica-')
+    primary_path = os.path.join(workdir, 'primary.db')
+    replica_path = os.path.join(workdir, 'replica.db')
+    # The replica file must exist before the app opens it; it is overwritten below
+    open(replica_path, 'w').close()
+    app = load_app(primary_path, REPLICA_DATABASE_URL=f'sqlite:///{replica_path}', PAGE_CACHE_ENABLED='true')
+    from models import db, Product
+    with app.app_context():
+        db.session.add(Product(name=REPLICA_NAME, category='food', price=9.99, stock=10, description='Replica check'))
+        db.session.commit()
+        product_id = db.session.query(Product.product_id).scalar()
+        db.engines['replica'].dispose()
+        shutil.copyfile(primary_path, replica_path)
+        # The primary moves on; the replica has not caught up
+        db.session.get(Product, product_id).name = PRIMARY_NAME
+        db.session.commit()
+
+    client = app.test_client()
+    failures = 0
+    for path in ('/', '/products?in_stock=1', f'/product/{product_id}'):
+        for expected_cache in ('MISS', 'HIT'):
+            response = client.get(path)
+            body = response.get_data(as_text=True)
+            status = response.headers.get('X-Cache')
+            ok = PRIMARY_NAME in body and REPLICA_NAME not in body and status == expected_cache
+            failures += not ok
+            print(f"{path:<28}{status or '-':>6}  {'ok' if ok else 'SERVED REPLICA DATA'}")
+    if failures:
+        print(f'{failures} check(s) failed', file=sys.stderr)
+        sys.exit(1)
+    print('cache fills read from the primary')
+
+
+if __name__ == '__main__':
+    main()
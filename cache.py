@@ -0,0 +1,93 @@
+"""
+Cache Backends
+An in-process LRU cache with per-entry TTL, and a Redis backend that can be
+shared between workers. Values must be JSON-serializable so either backend
+can be swapped in through CACHE_BACKEND.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+class MemoryCache:
+    """Thread-safe, size-bounded LRU cache whose entries expire after a TTL"""
+
+    def __init__(self, max_entries=1024, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (ttl or self.default_ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """Cache shared by every worker through Redis (requires the `redis` package)"""
+
+    def __init__(self, url, default_ttl=300, prefix='ecommerce:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl or self.default_ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+def create_cache(config):
+    """Build the cache backend selected by CACHE_BACKEND"""
+    if config['CACHE_BACKEND'] == 'redis':
+        return RedisCache(config['CACHE_REDIS_URL'], default_ttl=config['CACHE_DEFAULT_TTL'])
+    return MemoryCache(max_entries=config['CACHE_MAX_ENTRIES'],
+                       default_ttl=config['CACHE_DEFAULT_TTL'])
+
+
+def get_cache():
+    """Return the cache for the current app, creating it on first use"""
+    cache = current_app.extensions.get('cache')
+    if cache is None:
+        cache = create_cache(current_app.config)
+        current_app.extensions['cache'] = cache
+    return cache
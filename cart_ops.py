@@ -0,0 +1,212 @@
+"""
+Cart Operations
+Validates batches of cart mutations, applies them to a cart's lines and
+serializes the result; also reads and writes the stored `cart` rows for the
+cart store (cart_store.py). Used by the JSON cart API and by the classic
+form routes, so both follow the same rules.
+
+Operations are dicts with an "op" of:
+    add     {"product_id", "quantity"}  add to the line, creating it if needed
+    set     {"product_id", "quantity"}  set the quantity; 0 removes the line
+    remove  {"product_id"}              drop the line
+    clear   {}                          empty the cart
+"""
+from sqlalchemy import delete
+from sqlalchemy.dialects import mysql, sqlite
+from models import db, Cart, Product
+from cart_summary import store_cart_summary
+
+OPERATIONS = ('add', 'set', 'remove', 'clear')
+
+
+class CartOperationError(ValueError):
+    """Raised for an invalid operation; nothing in the batch is applied"""
+
+    def __init__(self, message, index=None):
+        self.index = index
+        super().__init__(message if index is None else f'Operation {index}: {message}')
+
+
+def _quantity(operation, index, allow_zero=False):
+    quantity = operation.get('quantity', 1 if operation['op'] == 'add' else None)
+    if isinstance(quantity, bool) or not isinstance(quantity, (int, str)):
+        raise CartOperationError('quantity must be a whole number', index)
+    try:
+        quantity = int(quantity)
+    except ValueError:
+        raise CartOperationError('quantity must be a whole number', index)
+    if quantity < 0 or (quantity == 0 and not allow_zero):
+        raise CartOperationError('quantity must be positive', index)
+    return quantity
+
+
+def _product_id(operation, index):
+    try:
+        return int(operation['product_id'])
+    except (KeyError, TypeError, ValueError):
+        raise CartOperationError('product_id is required', index)
+
+
+def validate_operations(operations, max_operations):
+    """Normalize a list of operation dicts, raising CartOperationError on the first bad one"""
+    if not isinstance(operations, list) or not operations:
+        raise CartOperationError('operations must be a non-empty list')
+    if len(operations) > max_operations:
+        raise CartOperationError(f'at most {max_operations} operations per request')
+    normalized = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            raise CartOperationError(f'op must be one of {", ".join(OPERATIONS)}', index)
+        op = operation['op']
+        if op == 'clear':
+            normalized.append(('clear', None, None))
+        elif op == 'remove':
+            normalized.append(('remove', _product_id(operation, index), None))
+        else:
+            normalized.append((op, _product_id(operation, index),
+                               _quantity(operation, index, allow_zero=(op == 'set'))))
+    return normalized
+
+
+def _net_changes(operations):
+    """
+    Fold a batch into its net effect per product.
+
+    Returns (clear_first, changes) where changes maps product_id to
+    ('add', n), ('set', n) or ('remove', None); an add after a set or a
+    clear becomes a set, since the resulting quantity is then known.
+    """
+    clear_first = False
+    changes = {}
+    for op, product_id, quantity in operations:
+        if op == 'clear':
+            clear_first = True
+            changes.clear()
+            continue
+        current = changes.get(product_id)
+        if op == 'remove' or (op == 'set' and quantity == 0):
+            changes[product_id] = ('remove', None)
+        elif op == 'set':
+            changes[product_id] = ('set', quantity)
+        elif current is None:
+            changes[product_id] = ('set', quantity) if clear_first else ('add', quantity)
+        elif current[0] == 'remove':
+            changes[product_id] = ('set', quantity)
+        else:
+            changes[product_id] = (current[0], current[1] + quantity)
+    return clear_first, changes
+
+
+def upsert_lines(user_id, quantities, increment):
+    """
+    Write {product_id: quantity} cart lines in one executemany upsert.
+
+    With `increment` the quantity is added to an existing line, otherwise it
+    replaces it. Relies on the unique (user_id, product_id) key, so
+    concurrent adds of the same product can't create duplicate lines.
+    """
+    table = Cart.__table__
+    dialect = db.session.get_bind(mapper=Cart).dialect.name
+    if dialect == 'mysql':
+        stmt = mysql.insert(table)
+        new_quantity = stmt.inserted.quantity
+        stmt = stmt.on_duplicate_key_update(
+            quantity=table.c.quantity + new_quantity if increment else new_quantity)
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(table)
+        new_quantity = stmt.excluded.quantity
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'product_id'],
+            set_={'quantity': table.c.quantity + new_quantity if increment else new_quantity})
+    else:
+        raise RuntimeError(f'Cart upserts are not supported on {dialect}')
+    db.session.execute(stmt, [{'user_id': user_id, 'product_id': product_id, 'quantity': quantity}
+                              for product_id, quantity in sorted(quantities.items())])
+
+
+def apply_to_lines(lines, operations):
+    """
+    Apply normalized operations to {product_id: quantity} cart lines.
+
+    Returns (new lines, product ids whose line changed, whether the cart was
+    cleared first). Doesn't touch the database; cart_items() checks that the
+    products exist when it loads them.
+    """
+    clear_first, changes = _net_changes(operations)
+    lines = {} if clear_first else dict(lines)
+    for product_id, (kind, quantity) in changes.items():
+        if kind == 'remove':
+            lines.pop(product_id, None)
+        elif kind == 'add':
+            lines[product_id] = lines.get(product_id, 0) + quantity
+        else:
+            lines[product_id] = quantity
+    return lines, set(changes), clear_first
+
+
+def cart_items(lines, operations=()):
+    """
+    Cart lines as dicts with their product details, in one query and in
+    the order they were added. Lines whose product has since been deleted
+    are left out, but a product that one of `operations` adds or sets must
+    exist, or CartOperationError is raised.
+    """
+    if not lines:
+        return []
+    products = {product.product_id: product for product in
+                Product.query.filter(Product.product_id.in_(list(lines)))}
+    for index, (op, product_id, _) in enumerate(operations):
+        if product_id in lines and product_id not in products:
+            raise CartOperationError(f'product {product_id} does not exist', index)
+    items = []
+    for product_id, quantity in lines.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        items.append({
+            'product_id': product_id,
+            'name': product.name,
+            'category': product.category,
+            'image': product.image,
+            'price': product.price,
+            'quantity': quantity,
+            'stock': product.stock,
+            'line_total': round(product.price * quantity, 2),
+        })
+    return items
+
+
+def load_lines(user_id):
+    """A user's stored cart as {product_id: quantity}, oldest line first"""
+    return dict(db.session.query(Cart.product_id, Cart.quantity)
+                .filter(Cart.user_id == user_id).order_by(Cart.cart_id))
+
+
+def write_lines(user_id, lines, changed, cleared=False):
+    """
+    Make a user's stored cart match `lines` for the `changed` products (all
+    of them after a clear) with at most one DELETE and one upsert, then commit.
+    Lines for products deleted in the meantime are skipped.
+    """
+    cart = Cart.__table__
+    if cleared:
+        db.session.execute(delete(cart).where(cart.c.user_id == user_id))
+        changed = set(lines)
+    else:
+        removed = [product_id for product_id in changed if product_id not in lines]
+        if removed:
+            db.session.execute(delete(cart).where(cart.c.user_id == user_id, cart.c.product_id.in_(removed)))
+    kept = [product_id for product_id in changed if product_id in lines]
+    if kept:
+        existing = {row.product_id for row in
+                    db.session.query(Product.product_id).filter(Product.product_id.in_(kept))}
+        quantities = {product_id: lines[product_id] for product_id in kept if product_id in existing}
+        if quantities:
+            upsert_lines(user_id, quantities, increment=False)
+    db.session.commit()
+
+
+def cart_payload(user_id, items):
+    """JSON body for the cart API; also refreshes the session cart summary"""
+    summary = store_cart_summary(user_id, len(items), sum(item['line_total'] for item in items))
+    return {'items': items, 'count': summary['count'], 'subtotal': summary['subtotal']}
@@ -0,0 +1,190 @@
+"""
+Cart Store
+Keeps the working copy of every cart in the session, so cart clicks don't
+write to the database and visitors can fill a cart before signing in.
+
+- Guest carts live only in the session.
+- A signed-in user's cart is read from the `cart` table, then changed in
+  the session and written back behind the user's clicks: changed lines are
+  flushed together once CART_FLUSH_MAX_PENDING products are pending or the
+  oldest change is CART_FLUSH_INTERVAL seconds old (checked on their next
+  request), and always before checkout and on logout.
+- The session copy is re-read (after flushing its pending changes) once it
+  is CART_REFRESH_INTERVAL seconds old, so changes and checkouts made on
+  another device show up within that time. Only changed lines are written,
+  so edits made on two devices in the meantime are both kept.
+- On login, a guest cart is merged into the user's stored cart.
+- While a guest cart holds products, a small `has_cart` cookie (readable by
+  scripts) tells cached pages to fetch the badge count; guests without one
+  make no cart request at all.
+
+Session state: {'user_id', 'lines': [[product_id, quantity], ...],
+'dirty': [product_id, ...], 'cleared': bool, 'since': timestamp,
+'loaded': timestamp}.
+"""
+import time
+from flask import after_this_request, current_app, request, session
+from flask_login import current_user
+from cart_ops import CartOperationError, apply_to_lines, cart_items, load_lines, upsert_lines, write_lines
+from cart_summary import refresh_cart_summary
+from models import db, Product
+
+SESSION_KEY = 'cart'
+GUEST_CART_COOKIE = 'has_cart'
+
+
+def owner():
+    """The signed-in user's id, or None for a guest"""
+    return current_user.user_id if current_user.is_authenticated else None
+
+
+def _new_state(user_id, lines):
+    return {'user_id': user_id, 'lines': [[product_id, quantity] for product_id, quantity in lines.items()],
+            'dirty': [], 'cleared': False, 'since': None, 'loaded': time.time()}
+
+
+def _state():
+    """This visitor's cart state, loading a signed-in user's cart on first use"""
+    user_id = owner()
+    state = session.get(SESSION_KEY)
+    if state is None or state.get('user_id') != user_id:
+        if user_id is None:
+            return _new_state(None, {})  # saved by apply(), so looking doesn't start a session
+        state = _new_state(user_id, load_lines(user_id))
+        session[SESSION_KEY] = state
+    return state
+
+
+def _mark_guest_cart(has_cart):
+    """Set or drop the has_cart cookie on this response if it doesn't match the guest cart"""
+    if has_cart == (request.cookies.get(GUEST_CART_COOKIE) == '1'):
+        return
+
+    @after_this_request
+    def set_marker(response):
+        if has_cart:
+            response.set_cookie(GUEST_CART_COOKIE, '1', samesite='Lax',
+                                secure=current_app.config['SESSION_COOKIE_SECURE'])
+        else:
+            response.delete_cookie(GUEST_CART_COOKIE)
+        return response
+
+
+def get_lines():
+    """The current cart as {product_id: quantity}"""
+    return {product_id: quantity for product_id, quantity in _state()['lines']}
+
+
+def get_items():
+    """The current cart lines with product details (see cart_ops.cart_items)"""
+    return cart_items(get_lines())
+
+
+def apply(operations):
+    """
+    Apply normalized operations to the current cart and return its items.
+
+    One query loads the products; nothing is written unless a flush falls
+    due. Raises CartOperationError if an operation is invalid or the cart
+    would grow beyond CART_MAX_LINES, leaving the cart unchanged.
+    """
+    state = _state()
+    current = get_lines()
+    lines, changed, cleared = apply_to_lines(current, operations)
+    if len(lines) > max(current_app.config['CART_MAX_LINES'], len(current)):
+        raise CartOperationError(f'a cart can hold at most {current_app.config["CART_MAX_LINES"]} products')
+    items = cart_items(lines, operations)
+
+    state['lines'] = [[product_id, quantity] for product_id, quantity in lines.items()]
+    if state['user_id'] is not None:
+        if cleared:
+            state['cleared'], state['dirty'] = True, sorted(changed)
+        else:
+            state['dirty'] = sorted(set(state['dirty']) | changed)
+        state['since'] = state['since'] or time.time()
+    else:
+        _mark_guest_cart(bool(lines))
+    session[SESSION_KEY] = state
+    flush_if_due()
+    return items
+
+
+def _due(state):
+    config = current_app.config
+    return (state['cleared'] or len(state['dirty']) >= config['CART_FLUSH_MAX_PENDING']
+            or time.time() - state['since'] >= config['CART_FLUSH_INTERVAL'])
+
+
+def flush(force=True):
+    """Write the signed-in user's pending cart changes to the database"""
+    state = session.get(SESSION_KEY)
+    if (state is None or state.get('user_id') is None or state['user_id'] != owner()
+            or not (state['dirty'] or state['cleared'])):
+        return False
+    if not force and not _due(state):
+        return False
+    lines = {product_id: quantity for product_id, quantity in state['lines']}
+    write_lines(state['user_id'], lines, set(state['dirty']), cleared=state['cleared'])
+    state.update(dirty=[], cleared=False, since=None)
+    session[SESSION_KEY] = state
+    return True
+
+
+def flush_if_due():
+    return flush(force=False)
+
+
+def refresh_if_stale():
+    """
+    Re-read the signed-in user's cart and badge summary once the session copy
+    is CART_REFRESH_INTERVAL seconds old, writing its pending changes first.
+    """
+    user_id = owner()
+    state = session.get(SESSION_KEY)
+    if (user_id is None or (state is not None and state.get('user_id') == user_id
+                            and time.time() - state.get('loaded', 0) < current_app.config['CART_REFRESH_INTERVAL'])):
+        return False
+    flush()
+    session[SESSION_KEY] = _new_state(user_id, load_lines(user_id))
+    refresh_cart_summary(user_id)
+    return True
+
+
+def reset():
+    """Forget the session copy, e.g. after checkout emptied the stored cart or on logout"""
+    session.pop(SESSION_KEY, None)
+    _mark_guest_cart(False)
+
+
+def merge_guest_cart(user_id):
+    """
+    Fold the guest cart into `user_id`'s stored cart after login, adding
+    quantities for products in both, and drop the guest copy.
+    """
+    state = session.pop(SESSION_KEY, None)
+    _mark_guest_cart(False)
+    if not state or state.get('user_id') is not None or not state['lines']:
+        return False
+    lines = {product_id: quantity for product_id, quantity in state['lines']}
+    existing = {row.product_id for row in
+                db.session.query(Product.product_id).filter(Product.product_id.in_(list(lines)))}
+    quantities = {product_id: quantity for product_id, quantity in lines.items() if product_id in existing}
+    if quantities:
+        upsert_lines(user_id, quantities, increment=True)
+        db.session.commit()
+    return True
+
+
+def init_app(app):
+    """Flush signed-in carts whose pending changes have waited long enough, and refresh stale ones"""
+
+    @app.before_request
+    def sync_cart():
+        if request.endpoint == 'static' or not current_user.is_authenticated:
+            return
+        try:
+            flush_if_due()
+            refresh_if_stale()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Cart write-behind sync failed; changes stay pending')
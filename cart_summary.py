@@ -0,0 +1,58 @@
+"""
+Cart Summary
+Keeps the cart badge figures (line count and subtotal) in the session so pages
+can render them without loading the user's cart rows. Guest summaries (user_id
+None) are only ever stored by the cart store.
+"""
+from flask import session
+from flask_login import current_user
+from sqlalchemy import func
+from models import db, Cart, Product
+
+SESSION_KEY = 'cart_summary'
+
+
+def compute_cart_summary(user_id):
+    """Count cart lines and sum their value in a single aggregate query"""
+    count, subtotal = (db.session.query(func.count(Cart.cart_id),
+                                        func.coalesce(func.sum(Cart.quantity * Product.price), 0))
+                       .join(Product, Product.product_id == Cart.product_id)
+                       .filter(Cart.user_id == user_id)
+                       .one())
+    return {'user_id': user_id, 'count': count, 'subtotal': float(subtotal)}
+
+
+def refresh_cart_summary(user_id):
+    """Recompute and store the summary after the user's cart has changed"""
+    summary = compute_cart_summary(user_id)
+    session[SESSION_KEY] = summary
+    return summary
+
+
+def store_cart_summary(user_id, count, subtotal):
+    """
+    Record figures the caller has already computed from the cart lines. An
+    empty guest cart with nothing stored yet is left out of the session, so
+    the badge lookup on cached pages doesn't give every visitor a cookie.
+    """
+    summary = {'user_id': user_id, 'count': count, 'subtotal': round(float(subtotal), 2)}
+    if user_id is not None or count or SESSION_KEY in session:
+        session[SESSION_KEY] = summary
+    return summary
+
+
+def clear_cart_summary(user_id):
+    """Record an emptied cart without querying, e.g. after checkout"""
+    session[SESSION_KEY] = {'user_id': user_id, 'count': 0, 'subtotal': 0.0}
+
+
+def get_cart_summary():
+    """The current visitor's cart summary, read from the session when available"""
+    summary = session.get(SESSION_KEY)
+    if not current_user.is_authenticated:
+        if summary is None or summary.get('user_id') is not None:
+            return {'user_id': None, 'count': 0, 'subtotal': 0.0}
+        return summary
+    if summary is None or summary.get('user_id') != current_user.user_id:
+        summary = refresh_cart_summary(current_user.user_id)
+    return summary
@@ -0,0 +1,108 @@
+"""
+Catalog Cache
+Read-through caching of catalog reads for the storefront. Products are cached
+as plain dicts so they can live in any cache backend and be shared safely
+between requests; the admin routes invalidate exactly the keys they affect.
+Misses are filled from the primary, never the read replica.
+"""
+from models import db, Product
+from cache import get_cache
+from db_routing import read_primary
+from facets import FACET_KEYS
+
+FEATURED_LIMIT = 4
+
+
+def product_snapshot(product):
+    """Serialize the product fields the storefront templates use"""
+    return {
+        'product_id': product.product_id,
+        'name': product.name,
+        'category': product.category,
+        'price': product.price,
+        'description': product.description,
+        'image': product.image,
+        'stock': product.stock,
+    }
+
+
+def get_featured(category):
+    """Featured products for a homepage category section"""
+    cache = get_cache()
+    key = f'featured:{category}'
+    products = cache.get(key)
+    if products is None:
+        with read_primary():
+            rows = (Product.query.filter_by(category=category)
+                    .order_by(Product.product_id)
+                    .limit(FEATURED_LIMIT)
+                    .all())
+        products = [product_snapshot(product) for product in rows]
+        cache.set(key, products)
+    return products
+
+
+def get_product(product_id):
+    """A single product for the detail page, or None if it does not exist"""
+    cache = get_cache()
+    key = f'product:{product_id}'
+    product = cache.get(key)
+    if product is None:
+        with read_primary():
+            row = Product.query.get(product_id)
+        if row is None:
+            return None
+        product = product_snapshot(row)
+        cache.set(key, product)
+    return product
+
+
+def get_listing(category, loader):
+    """
+    First page of a category listing (or of all products when category is empty).
+
+    `loader` runs the real query on a miss and returns a KeysetPage; only its
+    items and next cursor are cached.
+    """
+    cache = get_cache()
+    key = f'listing:{category or "all"}'
+    listing = cache.get(key)
+    if listing is None:
+        with read_primary():
+            page = loader()
+        listing = {'items': [product_snapshot(product) for product in page.items],
+                   'next_cursor': page.next_cursor}
+        cache.set(key, listing)
+    return listing
+
+
+def catalog_version():
+    """
+    Token that changes whenever any product is added, changed or removed.
+
+    Built from the newest updated_at and the product count, so the database
+    stays the source of truth; cached until the next invalidation.
+    """
+    cache = get_cache()
+    version = cache.get('catalog:version')
+    if version is None:
+        with read_primary():
+            latest, count = (db.session.query(db.func.max(Product.updated_at), db.func.count(Product.product_id))
+                             .one())
+        version = f'{latest.timestamp() if latest else 0:.6f}-{count}'
+        cache.set('catalog:version', version)
+    return version
+
+
+def invalidate_product(product_id, *categories):
+    """Drop every cached entry a change to this product can affect"""
+    keys = [f'product:{product_id}', 'listing:all', 'catalog:version', *FACET_KEYS.values()]
+    for category in set(categories):
+        if category:
+            keys.extend([f'featured:{category}', f'listing:{category}'])
+    get_cache().delete(*keys)
+
+
+def invalidate_stock(product_ids):
+    """Drop cached detail rows whose stock level has changed"""
+    get_cache().delete('catalog:version', *(f'product:{product_id}' for product_id in product_ids))
@@ -14,10 +14,140 @@ class Config:
     MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD') or 'admin'
     MYSQL_DATABASE = os.environ.get('MYSQL_DATABASE') or 'ecommerce_db'
     
-    SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}"
+    SQLALCHEMY_DATABASE_URI = (os.environ.get('DATABASE_URL') or
+                               f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Connection pool configuration
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 10)  # seconds to wait for a connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)  # below MySQL's wait_timeout
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_pre_ping': True,
+        'pool_recycle': DB_POOL_RECYCLE,
+    }
+    if not SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS.update(pool_size=DB_POOL_SIZE,
+                                         max_overflow=DB_MAX_OVERFLOW,
+                                         pool_timeout=DB_POOL_TIMEOUT)
+    
+    # Read replica: SELECTs from read-only views go here when configured
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    SQLALCHEMY_BINDS = {'replica': REPLICA_DATABASE_URL} if REPLICA_DATABASE_URL else {}
+    REPLICA_STICKY_SECONDS = 10  # read from the primary this long after a write
+    
+    # Password hashing (werkzeug method string; stored hashes are upgraded on login when it changes)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2)  # 0 hashes in the request thread
+    PASSWORD_HASH_MAX_PENDING = 32  # hashes queued or running before new requests are turned away
+    PASSWORD_HASH_TIMEOUT = 10  # seconds
+    
     # Upload configuration
     UPLOAD_FOLDER = 'static/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    IMAGE_WIDTHS = (240, 480, 800, 1200)  # responsive variants generated for each upload
+    IMAGE_QUALITY = 82
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS') or 1)  # 0 resizes in the request thread
+    IMPORT_BATCH_SIZE = 1000  # rows per multi-row upsert during bulk product imports
+    
+    # Pagination configuration
+    PER_PAGE = 24
+    MAX_PER_PAGE = 100
+    
+    # Search configuration
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'auto'  # auto, fulltext, memory
+    SEARCH_MAX_RESULTS = 500
+    SEARCH_INDEX_MAX_AGE = 300  # seconds before the in-memory index is rebuilt regardless
+    SEARCH_SUGGESTIONS = 8
+    
+    # Cache configuration
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'memory'  # memory, redis (needs the redis package)
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL') or 'redis://localhost:6379/0'
+    CACHE_MAX_ENTRIES = 2048
+    CACHE_DEFAULT_TTL = 300  # seconds
+    USER_CACHE_TTL = 60  # seconds a logged-in user's name and role may be served from cache
+    
+    # HTTP caching and compression for dynamic pages
+    HTTP_CACHE_MAX_AGE = 60  # seconds shared caches may reuse anonymous catalog pages
+    COMPRESS_MIMETYPES = {'text/html', 'application/json'}
+    COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies aren't worth encoding
+    GZIP_LEVEL = 6
+    BROTLI_QUALITY = 5  # on-the-fly; build-assets uses 11 for static files
+    
+    # Full-page cache for anonymous catalog pages
+    PAGE_CACHE_ENABLED = (os.environ.get('PAGE_CACHE_ENABLED') or 'true').lower() == 'true'
+    PAGE_CACHE_TTL = 30  # seconds a page is served without re-rendering
+    PAGE_CACHE_STALE_TTL = 300  # further seconds it may be served while a refresh runs
+    PAGE_CACHE_LOCK_TIMEOUT = 5  # seconds a miss waits for a concurrent render of the same page
+    
+    # JSON cart API
+    CART_API_MAX_OPERATIONS = 50  # mutations accepted in one batch request
+    
+    # Session cart store: signed-in carts are written back once this many products
+    # have changed or the oldest change is this many seconds old (and at checkout)
+    CART_FLUSH_MAX_PENDING = 10
+    CART_FLUSH_INTERVAL = 60
+    CART_REFRESH_INTERVAL = 30  # seconds before the session copy is re-read, picking up other devices' changes
+    CART_MAX_LINES = 50  # bounds the session cookie
+    
+    # Transactional outbox drained by `flask outbox-worker`
+    OUTBOX_BATCH_SIZE = 50  # events claimed per poll
+    OUTBOX_WORKER_THREADS = 4
+    OUTBOX_POLL_INTERVAL = 1.0  # seconds between polls when idle
+    OUTBOX_LEASE_SECONDS = 300  # a claimed event is retried by another worker after this
+    OUTBOX_MAX_ATTEMPTS = 8
+    OUTBOX_RETRY_BASE = 5  # seconds before the first retry, doubling each attempt
+    OUTBOX_RETRY_MAX = 3600
+    OUTBOX_RETENTION_DAYS = 7  # delivered events are pruned after this
+    OUTBOX_PRUNE_INTERVAL = 3600  # seconds
+    LOW_STOCK_THRESHOLD = 5
+    
+    # Product listing facets: price bucket edges and how long cached counts may lag stock changes
+    FACET_PRICE_BREAKS = (10, 25, 50, 100)
+    FACET_CACHE_TTL = 300
+    
+    # Sales analytics (admin/analytics): days shown by default and top sellers listed
+    ANALYTICS_DEFAULT_DAYS = 30
+    ANALYTICS_TOP_PRODUCTS = 10
+    ANALYTICS_MAX_DAYS = 366  # longest range one page draws, one point per day
+    
+    # Rate limits: token buckets per endpoint, refilled at `requests` per `seconds`
+    # for each client IP and each signed-in user; only the listed methods, and
+    # requests carrying all of `when_args`, are counted
+    RATELIMIT_ENABLED = (os.environ.get('RATELIMIT_ENABLED') or 'true').lower() == 'true'
+    RATELIMIT_BACKEND = os.environ.get('RATELIMIT_BACKEND') or 'memory'  # memory, redis (shared by all workers)
+    RATELIMIT_REDIS_URL = os.environ.get('RATELIMIT_REDIS_URL') or CACHE_REDIS_URL
+    RATELIMIT_MAX_KEYS = 10000  # buckets kept by the memory backend
+    RATELIMIT_POLICIES = {
+        'auth.login': {'methods': ('POST',), 'limits': {'ip': (10, 60)}},
+        'auth.signup': {'methods': ('POST',), 'limits': {'ip': (5, 300)}},
+        'user.products': {'when_args': ('search',), 'limits': {'ip': (30, 60), 'user': (30, 60)}},
+        'user.search_suggest': {'limits': {'ip': (120, 60), 'user': (120, 60)}},
+        'user.checkout': {'methods': ('POST',), 'limits': {'ip': (20, 60), 'user': (5, 60)}},
+    }
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted (for per-IP limits)
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS') or 0)
+    
+    # Load shedding: requests in flight per worker process above which the
+    # rate-limited endpoints, then all requests, get 503 with Retry-After
+    LOAD_SHED_ENABLED = (os.environ.get('LOAD_SHED_ENABLED') or 'true').lower() == 'true'
+    LOAD_SHED_POLICY_IN_FLIGHT = int(os.environ.get('LOAD_SHED_POLICY_IN_FLIGHT') or 16)
+    LOAD_SHED_MAX_IN_FLIGHT = int(os.environ.get('LOAD_SHED_MAX_IN_FLIGHT') or 64)
+    LOAD_SHED_RETRY_AFTER = 5  # seconds
+    
+    # Dashboard statistics: rows per counter, spreading concurrent updates
+    STATS_SHARDS = 8
+    
+    # Request metrics served on /metrics in Prometheus text format
+    METRICS_ENABLED = (os.environ.get('METRICS_ENABLED') or 'true').lower() == 'true'
+    # Scrapers must send "Authorization: Bearer <token>"; without a token only loopback and
+    # private addresses may scrape (behind a proxy, set TRUSTED_PROXY_HOPS or a token)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD') or 1.0)  # seconds
+    METRICS_MAX_CAPTURED_SQL = 50  # statements kept per request for the slow-request log
+    
+    # Development: warn when a request runs the same statement this many times (likely N+1)
+    N_PLUS_ONE_DETECTION = (os.environ.get('N_PLUS_ONE_DETECTION') or 'false').lower() == 'true'
+    N_PLUS_ONE_THRESHOLD = 5
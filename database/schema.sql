@@ -19,15 +19,29 @@ CREATE TABLE IF NOT EXISTS users (
 -- Products table
 CREATE TABLE IF NOT EXISTS products (
     product_id INT AUTO_INCREMENT PRIMARY KEY,
+    sku VARCHAR(64) UNIQUE,
     name VARCHAR(200) NOT NULL,
     category VARCHAR(50) NOT NULL,
     price DECIMAL(10, 2) NOT NULL,
     description TEXT,
     image VARCHAR(255),
     stock INT DEFAULT 100 NOT NULL,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    units_sold INT DEFAULT 0 NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- Databases created before these columns existed: add them before loading the indexes below
+-- ALTER TABLE products ADD COLUMN sku VARCHAR(64) NULL AFTER product_id, ADD UNIQUE KEY sku (sku);
+-- ALTER TABLE products ADD COLUMN updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+-- CREATE INDEX idx_product_updated ON products(updated_at);
+-- ALTER TABLE products ADD COLUMN units_sold INT DEFAULT 0 NOT NULL AFTER stock;
+-- CREATE INDEX idx_product_price ON products(price, product_id);
+-- CREATE INDEX idx_product_category_price ON products(category, price, product_id);
+-- CREATE INDEX idx_product_units_sold ON products(units_sold, product_id);
+-- CREATE INDEX idx_product_category_units_sold ON products(category, units_sold, product_id);
+-- then run `flask backfill-analytics` to count units_sold from past orders
+
 -- Cart table
 CREATE TABLE IF NOT EXISTS cart (
     cart_id INT AUTO_INCREMENT PRIMARY KEY,
@@ -35,10 +49,17 @@ CREATE TABLE IF NOT EXISTS cart (
     product_id INT NOT NULL,
     quantity INT DEFAULT 1 NOT NULL,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_cart_user_product (user_id, product_id),
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
     FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- Databases created before the unique key existed: merge duplicate lines, then add it
+-- UPDATE cart c JOIN (SELECT MIN(cart_id) AS keep_id, SUM(quantity) AS total FROM cart
+--     GROUP BY user_id, product_id HAVING COUNT(*) > 1) d ON c.cart_id = d.keep_id SET c.quantity = d.total;
+-- DELETE c FROM cart c JOIN cart k ON k.user_id = c.user_id AND k.product_id = c.product_id AND k.cart_id < c.cart_id;
+-- ALTER TABLE cart ADD UNIQUE KEY uq_cart_user_product (user_id, product_id);
+
 -- Orders table
 CREATE TABLE IF NOT EXISTS orders (
     order_id INT AUTO_INCREMENT PRIMARY KEY,
@@ -63,6 +84,52 @@ CREATE TABLE IF NOT EXISTS order_items (
     FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- Dashboard counters (sharded; rebuilt by `flask reconcile-stats`)
+CREATE TABLE IF NOT EXISTS store_stats (
+    name VARCHAR(50) NOT NULL,
+    shard INT DEFAULT 0 NOT NULL,
+    value DOUBLE DEFAULT 0 NOT NULL,
+    PRIMARY KEY (name, shard)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Sales analytics rollups, maintained by checkout and order status changes
+-- (rebuild with `flask backfill-analytics`)
+CREATE TABLE IF NOT EXISTS sales_daily (
+    day DATE NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    shard INT DEFAULT 0 NOT NULL,
+    orders INT DEFAULT 0 NOT NULL,
+    units INT DEFAULT 0 NOT NULL,
+    revenue DOUBLE DEFAULT 0 NOT NULL,
+    PRIMARY KEY (day, category, status, shard)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS product_sales_daily (
+    day DATE NOT NULL,
+    product_id INT NOT NULL,
+    units INT DEFAULT 0 NOT NULL,
+    revenue DOUBLE DEFAULT 0 NOT NULL,
+    PRIMARY KEY (day, product_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Transactional outbox: side effects recorded with the order, drained by `flask outbox-worker`
+CREATE TABLE IF NOT EXISTS outbox_events (
+    event_id INT AUTO_INCREMENT PRIMARY KEY,
+    event_type VARCHAR(50) NOT NULL,
+    handler VARCHAR(100) NOT NULL,
+    idempotency_key VARCHAR(200) NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending' NOT NULL,
+    attempts INT DEFAULT 0 NOT NULL,
+    available_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    claimed_by VARCHAR(64),
+    last_error TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    processed_at DATETIME,
+    INDEX idx_outbox_status_available (status, available_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- Note: User accounts should be created through the application or init_db.py script
 -- to ensure proper password hashing. Sample users will be created by init_db.py
 
@@ -103,3 +170,22 @@ CREATE INDEX idx_cart_user ON cart(user_id);
 CREATE INDEX idx_order_user ON orders(user_id);
 CREATE INDEX idx_order_status ON orders(status);
 CREATE INDEX idx_order_date ON orders(order_date);
+
+-- Composite indexes backing keyset pagination (newest first, primary key tie-break)
+CREATE INDEX idx_product_created ON products(created_at, product_id);
+CREATE INDEX idx_product_category_created ON products(category, created_at, product_id);
+CREATE INDEX idx_order_date_id ON orders(order_date, order_id);
+CREATE INDEX idx_order_user_date ON orders(user_id, order_date, order_id);
+CREATE INDEX idx_order_status_date ON orders(status, order_date, order_id);
+
+-- Latest product change, used to version catalog pages for HTTP caching
+CREATE INDEX idx_product_updated ON products(updated_at);
+
+-- Keyset pagination for the price and popularity sorts of the product listing
+CREATE INDEX idx_product_price ON products(price, product_id);
+CREATE INDEX idx_product_category_price ON products(category, price, product_id);
+CREATE INDEX idx_product_units_sold ON products(units_sold, product_id);
+CREATE INDEX idx_product_category_units_sold ON products(category, units_sold, product_id);
+
+-- Full-text index for ranked product search
+ALTER TABLE products ADD FULLTEXT INDEX ft_product_search (name, description, category);
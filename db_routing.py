@@ -0,0 +1,89 @@
+"""
+Read Replica Routing
+Sends SELECTs issued by read-only views to the `replica` bind and everything
+else to the primary. After a browser session writes, its reads stick to the
+primary for REPLICA_STICKY_SECONDS so users always see their own changes.
+
+Reads that fill a shared cache go to the primary (see read_primary()): a
+lagging replica would otherwise put pre-invalidation data back in the cache
+for its whole TTL.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+REPLICA_BIND = 'replica'
+STICKY_SESSION_KEY = 'read_primary_until'
+
+
+def read_replica(f):
+    """Decorator marking a view whose queries may be served by the read replica"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.use_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+@contextmanager
+def read_primary():
+    """
+    Send the reads in this block to the primary, e.g. to fill a shared cache.
+
+    Wins over @read_replica on views called inside the block (as the page
+    cache does), and blocks may nest.
+    """
+    if not has_request_context():
+        yield
+        return
+    g.primary_depth = g.get('primary_depth', 0) + 1
+    try:
+        yield
+    finally:
+        g.primary_depth -= 1
+
+
+def _replica_allowed():
+    if (not has_request_context() or not g.get('use_replica') or g.get('primary_depth')
+            or g.get('db_wrote')):
+        return False
+    return session.get(STICKY_SESSION_KEY, 0) < time.time()
+
+
+class RoutingSession(Session):
+    """Session that routes read-only SELECTs to the replica bind when one is configured"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and isinstance(clause, Select)
+                and REPLICA_BIND in self._db.engines and _replica_allowed()):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _mark_write():
+    if has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(db_session, flush_context):
+    _mark_write()
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _after_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_write()
+
+
+def init_app(app):
+    """Pin a browser session to the primary for a while after it writes"""
+    @app.after_request
+    def stick_to_primary(response):
+        if g.get('db_wrote'):
+            session[STICKY_SESSION_KEY] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+        return response
@@ -0,0 +1,218 @@
+"""
+Catalog Filters and Facets
+Price range, in-stock and sort options for the product listing, plus the
+per-category and per-price-bucket counts shown next to the results.
+
+Counts come from one small matrix of (category, price bucket) -> products,
+built with a single GROUP BY and cached (one copy for in-stock products, one
+for all), so any combination of the bucket filters is answered from it. The
+admin routes drop it through catalog.invalidate_product(); stock changes
+only expire it after FACET_CACHE_TTL, since a checkout rarely sells a product
+out and rebuilding it on every order would defeat the cache.
+
+Counts are disjunctive: the category counts respect the selected price range
+and the price counts the selected category, so each facet shows what
+choosing one of its other values would return.
+"""
+from flask import current_app, request, url_for
+from sqlalchemy import case, func
+from models import db, Product
+from cache import get_cache
+from db_routing import read_primary
+
+SORTS = {
+    'relevance': ('Best match', None, None),  # search results only
+    'newest': ('Newest', Product.created_at, True),
+    'price_asc': ('Price: low to high', Product.price, False),
+    'price_desc': ('Price: high to low', Product.price, True),
+    'popular': ('Most popular', Product.units_sold, True),
+}
+DEFAULT_SORT = 'newest'
+
+FACET_KEYS = {False: 'facets:all', True: 'facets:in_stock'}
+
+
+def _price(args, name):
+    value = args.get(name, type=float)
+    return value if value is not None and value >= 0 else None
+
+
+def parse_filters(args):
+    """Listing filters from a query string; invalid values are ignored"""
+    searching = bool(args.get('search'))
+    sort = args.get('sort')
+    if sort not in SORTS or (sort == 'relevance' and not searching):
+        sort = 'relevance' if searching else DEFAULT_SORT
+    return {
+        'category': args.get('category', ''),
+        'min_price': _price(args, 'min_price'),
+        'max_price': _price(args, 'max_price'),
+        'in_stock': args.get('in_stock') in ('1', 'on', 'true'),
+        'sort': sort,
+    }
+
+
+def has_refinements(filters):
+    """Whether anything beyond the category is being filtered or sorted on"""
+    return (filters['min_price'] is not None or filters['max_price'] is not None
+            or filters['in_stock'] or filters['sort'] not in ('relevance', DEFAULT_SORT))
+
+
+def apply_filters(query, filters):
+    """Restrict a Product query to the filters; prices are [min_price, max_price)"""
+    if filters['category']:
+        query = query.filter(Product.category == filters['category'])
+    if filters['min_price'] is not None:
+        query = query.filter(Product.price >= filters['min_price'])
+    if filters['max_price'] is not None:
+        query = query.filter(Product.price < filters['max_price'])
+    if filters['in_stock']:
+        query = query.filter(Product.stock > 0)
+    return query
+
+
+def sort_for(filters):
+    """(sort column, descending) for paginate()"""
+    _, column, descending = SORTS[filters['sort']]
+    return column, descending
+
+
+def price_buckets():
+    """[(label, low, high)] from FACET_PRICE_BREAKS; open ends are None"""
+    breaks = list(current_app.config['FACET_PRICE_BREAKS'])
+    bounds = [None] + breaks + [None]
+    buckets = []
+    for low, high in zip(bounds, bounds[1:]):
+        if low is None:
+            label = f'Under ₹{high:g}'
+        elif high is None:
+            label = f'₹{low:g} and above'
+        else:
+            label = f'₹{low:g} – ₹{high:g}'
+        buckets.append((label, low, high))
+    return buckets
+
+
+def _bucket_index(price, breaks):
+    return sum(1 for edge in breaks if price >= edge)
+
+
+def _facet_matrix(in_stock):
+    """[[category, bucket index, count], ...] for all (or only in-stock) products"""
+    cache = get_cache()
+    key = FACET_KEYS[in_stock]
+    rows = cache.get(key)
+    if rows is None:
+        breaks = current_app.config['FACET_PRICE_BREAKS']
+        bucket = case(*((Product.price < edge, index) for index, edge in enumerate(breaks)),
+                      else_=len(breaks))
+        query = db.session.query(Product.category, bucket, func.count(Product.product_id))
+        if in_stock:
+            query = query.filter(Product.stock > 0)
+        with read_primary():
+            rows = [[category, int(index), count] for category, index, count in
+                    query.group_by(Product.category, bucket)]
+        cache.set(key, rows, ttl=current_app.config['FACET_CACHE_TTL'])
+    return rows
+
+
+def _in_range(bucket, filters):
+    """Whether a price bucket lies inside the selected range, or None if it straddles an edge"""
+    _, low, high = bucket
+    min_price, max_price = filters['min_price'], filters['max_price']
+    if (min_price is not None and high is not None and high <= min_price) or \
+            (max_price is not None and low is not None and low >= max_price):
+        return False
+    if (min_price is not None and (low is None or low < min_price)) or \
+            (max_price is not None and (high is None or high > max_price)):
+        return None
+    return True
+
+
+def _summarize(category_counts, bucket_counts, buckets):
+    return {
+        'categories': sorted(category_counts.items()),
+        'prices': [(label, low, high, bucket_counts.get(index, 0))
+                   for index, (label, low, high) in enumerate(buckets)],
+    }
+
+
+def facet_counts(filters):
+    """
+    Category and price bucket counts for a listing, from the cached matrix.
+
+    A hand-written price range that cuts through a bucket can't be answered
+    from the matrix; its category counts come from a direct query instead.
+    """
+    buckets = price_buckets()
+    rows = _facet_matrix(filters['in_stock'])
+    coverage = [_in_range(bucket, filters) for bucket in buckets]
+
+    bucket_counts = {}
+    for category, index, count in rows:
+        if not filters['category'] or category == filters['category']:
+            bucket_counts[index] = bucket_counts.get(index, 0) + count
+
+    if None in coverage:
+        query = apply_filters(db.session.query(Product.category, func.count(Product.product_id)),
+                              dict(filters, category=''))
+        category_counts = dict(query.group_by(Product.category).all())
+    else:
+        category_counts = {}
+        for category, index, count in rows:
+            if coverage[index]:
+                category_counts[category] = category_counts.get(category, 0) + count
+    return _summarize(category_counts, bucket_counts, buckets)
+
+
+def search_matches(ranked_ids, filters):
+    """
+    Apply the filters and sort to ranked search results.
+
+    Returns (product ids in display order, facet counts over the matches).
+    Search results are bounded by SEARCH_MAX_RESULTS, so this is one query
+    for the candidates' filter columns and the rest happens here.
+    """
+    if not ranked_ids:
+        return [], _summarize({}, {}, price_buckets())
+    rows = (db.session.query(Product.product_id, Product.category, Product.price, Product.stock,
+                             Product.created_at, Product.units_sold)
+            .filter(Product.product_id.in_(ranked_ids)).all())
+    position = {product_id: index for index, product_id in enumerate(ranked_ids)}
+    breaks = current_app.config['FACET_PRICE_BREAKS']
+    buckets = price_buckets()
+    min_price, max_price = filters['min_price'], filters['max_price']
+
+    category_counts, bucket_counts, matches = {}, {}, []
+    for row in rows:
+        if filters['in_stock'] and row.stock <= 0:
+            continue
+        in_category = not filters['category'] or row.category == filters['category']
+        in_price = ((min_price is None or row.price >= min_price)
+                    and (max_price is None or row.price < max_price))
+        if in_price:
+            category_counts[row.category] = category_counts.get(row.category, 0) + 1
+        if in_category:
+            index = _bucket_index(row.price, breaks)
+            bucket_counts[index] = bucket_counts.get(index, 0) + 1
+        if in_category and in_price:
+            matches.append(row)
+
+    _, column, descending = SORTS[filters['sort']]
+    matches.sort(key=lambda row: position[row.product_id])
+    if column is not None:
+        matches.sort(key=lambda row: getattr(row, column.key) or 0, reverse=descending)
+    return [row.product_id for row in matches], _summarize(category_counts, bucket_counts, buckets)
+
+
+def filter_url(**changes):
+    """URL of the current listing with some filters changed (None removes one) and paging reset"""
+    args = request.args.to_dict()
+    for name in ('after', 'before'):
+        args.pop(name, None)
+    for name, value in changes.items():
+        if value is None:
+            args.pop(name, None)
+        else:
+            args[name] = value
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
@@ -0,0 +1,103 @@
+"""
+HTTP Caching
+Conditional GET and compression for dynamic pages.
+
+Catalog views decorated with @catalog_page get an ETag built from the
+catalog version before the view runs, so a matching If-None-Match is
+answered with 304 without touching templates or the database. Anonymous
+visitors get a short public Cache-Control; signed-in users (whose pages show
+their name and cart) get private, revalidated responses.
+
+Every other HTML/JSON response gets a body-hash ETag and a private
+Cache-Control, and bodies above COMPRESS_MIN_SIZE are gzip or brotli encoded.
+"""
+import gzip
+import hashlib
+from functools import wraps
+from flask import current_app, g, make_response, request, session
+from flask_login import current_user
+from catalog import catalog_version
+from cart_summary import get_cart_summary
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+
+def _catalog_etag():
+    if current_user.is_authenticated:
+        viewer = f'user:{current_user.user_id}:{get_cart_summary()["count"]}'
+    else:
+        viewer = 'anonymous'
+    key = '|'.join((catalog_version(), viewer, request.full_path))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _apply_catalog_policy(response, etag):
+    response.set_etag(etag, weak=True)
+    if current_user.is_authenticated:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config['HTTP_CACHE_MAX_AGE']
+    response.vary.add('Cookie')
+    g.http_cache_handled = True
+    return response
+
+
+def catalog_page(view):
+    """Serve 304s for unchanged catalog pages and mark them cacheable"""
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        # Pages carrying a flash message are one-offs
+        if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+            return view(*args, **kwargs)
+        etag = _catalog_etag()
+        if request.if_none_match.contains_weak(etag):
+            return _apply_catalog_policy(make_response('', 304), etag)
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or g.pop('page_cache_stale', False):
+            return response
+        return _apply_catalog_policy(response, etag)
+    return decorated_function
+
+
+def _compress(response):
+    """Encode the body with the best encoding the client accepts, if worthwhile"""
+    config = current_app.config
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in config['COMPRESS_MIMETYPES']
+            or 'Content-Encoding' in response.headers):
+        return
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < config['COMPRESS_MIN_SIZE']:
+        return
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(body, quality=config['BROTLI_QUALITY']))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=config['GZIP_LEVEL']))
+        response.headers['Content-Encoding'] = 'gzip'
+
+
+def init_app(app):
+    """Add validators, default cache policy and compression to dynamic responses"""
+
+    @app.after_request
+    def finalize_response(response):
+        if response.direct_passthrough or response.is_streamed:
+            return response
+        if not g.pop('http_cache_handled', False) and response.mimetype in app.config['COMPRESS_MIMETYPES']:
+            if not response.cache_control.public:
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            if request.method in ('GET', 'HEAD') and response.status_code == 200:
+                # Weak: the same validator covers the compressed and identity encodings
+                response.add_etag(weak=True)
+                response.make_conditional(request)
+        _compress(response)
+        return response
@@ -0,0 +1,72 @@
+"""
+User Identity Cache
+Flask-Login asks for the current user on every authenticated request, but
+most views only need the id, name and role. Those are cached for a short TTL
+and exposed as a lightweight CachedUser; the ORM User is loaded only when a
+view asks for it.
+"""
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from models import db, User
+from cache import get_cache
+from db_routing import read_primary
+
+# Changes to these columns make a cached identity stale
+IDENTITY_FIELDS = ('name', 'email', 'role')
+
+
+class CachedUser(UserMixin):
+    """The identity fields of a User, safe to keep outside a database session"""
+
+    def __init__(self, user_id, name, email, role):
+        self.user_id = user_id
+        self.name = name
+        self.email = email
+        self.role = role
+
+    def get_id(self):
+        return str(self.user_id)
+
+    def load(self):
+        """Fetch the full User row, for views that need more than the identity"""
+        return db.session.get(User, self.user_id)
+
+    def __repr__(self):
+        return f'<CachedUser {self.email}>'
+
+
+def _cache_key(user_id):
+    return f'user:{user_id}'
+
+
+def load_identity(user_id):
+    """Return a CachedUser for `user_id`, or None if the user no longer exists"""
+    cache = get_cache()
+    key = _cache_key(user_id)
+    identity = cache.get(key)
+    if identity is None:
+        with read_primary():
+            row = (db.session.query(User.user_id, User.name, User.email, User.role)
+                   .filter(User.user_id == user_id).first())
+        if row is None:
+            return None
+        identity = {'user_id': row.user_id, 'name': row.name, 'email': row.email, 'role': row.role}
+        cache.set(key, identity, ttl=current_app.config['USER_CACHE_TTL'])
+    return CachedUser(**identity)
+
+
+def invalidate_identity(user_id):
+    get_cache().delete(_cache_key(user_id))
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in IDENTITY_FIELDS):
+        invalidate_identity(target.user_id)
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    invalidate_identity(target.user_id)
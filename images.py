@@ -0,0 +1,195 @@
+"""
+Product Images
+Stores uploaded product images under content-hashed filenames, so the same
+picture uploaded twice is kept once and every URL can be cached forever, and
+resizes each upload into several widths (plus WebP copies) in a background
+process pool for responsive `srcset` markup.
+
+A finished upload has a `<digest>.json` manifest next to it listing its
+variants; until the pool has written it, pages fall back to the original.
+The pool uses the 'spawn' start method, so scripts that upload images must
+keep their entry point under `if __name__ == '__main__':`.
+"""
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app, url_for
+from PIL import Image, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_manifests = {}
+
+
+class InvalidImageError(ValueError):
+    """Raised when an upload isn't an image in one of the allowed formats"""
+
+
+def _upload_dir():
+    return os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+
+
+def _upload_url(filename):
+    static_prefix = current_app.static_folder
+    folder = os.path.relpath(_upload_dir(), static_prefix).replace(os.sep, '/')
+    return url_for('static', filename=f'{folder}/{filename}')
+
+
+def make_variants(source_path, widths, quality):
+    """
+    Write resized JPEG/PNG and WebP copies of `source_path` and then its manifest.
+
+    Runs in the worker pool. Widths at or above the original's are skipped, so
+    small images aren't upscaled; the manifest is written last and atomically,
+    which is what marks the upload as ready.
+    """
+    directory, filename = os.path.split(source_path)
+    digest, ext = os.path.splitext(filename)
+    variants = []
+    with Image.open(source_path) as original:
+        original.load()
+        keep_alpha = original.mode in ('RGBA', 'LA', 'P')
+        image = original.convert('RGBA' if keep_alpha else 'RGB')
+        fallback_ext = '.png' if keep_alpha else '.jpg'
+        for width in sorted(set(widths)):
+            if width >= image.width:
+                continue
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.LANCZOS)
+            fallback = f'{digest}-{width}w{fallback_ext}'
+            webp = f'{digest}-{width}w.webp'
+            if keep_alpha:
+                resized.save(os.path.join(directory, fallback), optimize=True)
+            else:
+                resized.save(os.path.join(directory, fallback), quality=quality, optimize=True, progressive=True)
+            resized.save(os.path.join(directory, webp), quality=quality, method=4)
+            variants.append({'width': width, 'fallback': fallback, 'webp': webp})
+        full_webp = f'{digest}.webp'
+        image.save(os.path.join(directory, full_webp), quality=quality, method=4)
+        variants.append({'width': image.width, 'fallback': filename, 'webp': full_webp})
+
+    manifest_path = os.path.join(directory, f'{digest}.json')
+    with open(manifest_path + '.tmp', 'w') as stream:
+        json.dump({'original': filename, 'variants': variants}, stream)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest_path
+
+
+def _get_pool():
+    """Return this process's resize pool, recreating it after a fork"""
+    global _pool, _pool_pid
+    workers = current_app.config['IMAGE_WORKERS']
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _log_failure(future):
+    exc = future.exception()
+    if exc is not None:
+        logger.error('Generating image variants failed: %s', exc)
+
+
+def schedule_variants(source_path):
+    """Queue variant generation for a stored upload (inline when IMAGE_WORKERS is 0)"""
+    config = current_app.config
+    args = (source_path, config['IMAGE_WIDTHS'], config['IMAGE_QUALITY'])
+    pool = _get_pool()
+    if pool is None:
+        make_variants(*args)
+    else:
+        pool.submit(make_variants, *args).add_done_callback(_log_failure)
+
+
+def uploads_missing_variants():
+    """Paths of stored originals that have no manifest yet, e.g. after a worker crash"""
+    directory = _upload_dir()
+    if not os.path.isdir(directory):
+        return []
+    allowed = current_app.config['ALLOWED_EXTENSIONS'] | {'jpg'}
+    missing = []
+    for filename in sorted(os.listdir(directory)):
+        digest, ext = os.path.splitext(filename)
+        if '-' in digest or ext.lstrip('.') not in allowed:
+            continue
+        if not os.path.exists(os.path.join(directory, f'{digest}.json')):
+            missing.append(os.path.join(directory, filename))
+    return missing
+
+
+def save_upload(upload):
+    """
+    Store an uploaded werkzeug FileStorage and return the URL to save on the product.
+
+    The file is named by the SHA-256 of its content; if that file already
+    exists nothing is written or resized again.
+    """
+    ext = os.path.splitext(upload.filename or '')[1].lower().lstrip('.')
+    if ext not in current_app.config['ALLOWED_EXTENSIONS']:
+        raise InvalidImageError(f'Images must be one of: {", ".join(sorted(current_app.config["ALLOWED_EXTENSIONS"]))}')
+    data = upload.read()
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+    except (UnidentifiedImageError, OSError, ValueError, SyntaxError, Image.DecompressionBombError):
+        # Pillow raises SyntaxError for broken PNG chunks
+        raise InvalidImageError('The uploaded file is not a valid image')
+
+    ext = 'jpg' if ext == 'jpeg' else ext
+    filename = f'{hashlib.sha256(data).hexdigest()[:32]}.{ext}'
+    directory = _upload_dir()
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        with open(path + '.tmp', 'wb') as stream:
+            stream.write(data)
+        os.replace(path + '.tmp', path)
+        schedule_variants(path)
+    return _upload_url(filename)
+
+
+def _load_manifest(digest):
+    manifest = _manifests.get(digest)
+    if manifest is None:
+        try:
+            with open(os.path.join(_upload_dir(), f'{digest}.json')) as stream:
+                manifest = json.load(stream)
+        except (OSError, ValueError):
+            return None
+        _manifests[digest] = manifest
+    return manifest
+
+
+def responsive_image(image):
+    """
+    {'src', 'srcset', 'webp_srcset'} for a product image URL.
+
+    Remote URLs and uploads whose variants aren't ready yet get just 'src'.
+    """
+    if not image:
+        return None
+    result = {'src': image, 'srcset': None, 'webp_srcset': None}
+    prefix = _upload_url('')
+    if not image.startswith(prefix):
+        return result
+    digest = os.path.splitext(image[len(prefix):])[0]
+    manifest = _load_manifest(digest)
+    if manifest is None:
+        return result
+    variants = manifest['variants']
+    result['srcset'] = ', '.join(f"{prefix}{v['fallback']} {v['width']}w" for v in variants)
+    result['webp_srcset'] = ', '.join(f"{prefix}{v['webp']} {v['width']}w" for v in variants)
+    return result
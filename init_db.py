@@ -4,6 +4,7 @@ Run this script to set up the database with sample data and proper password hash
 """
 from app import app, db
 from models import User, Product
+from stats import reconcile_stats
 from werkzeug.security import generate_password_hash
 
 def init_database():
@@ -128,6 +129,10 @@ def init_database():
         
         # Commit all changes
         db.session.commit()
+        
+        # Rebuild dashboard counters from the seeded data
+        reconcile_stats()
+        print("✓ Dashboard statistics reconciled!")
         print("\n" + "="*50)
         print("Database initialization completed successfully!")
         print("="*50)
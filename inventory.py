@@ -0,0 +1,57 @@
+"""
+Inventory
+Stock reservation for checkout. Each product is decremented with a single
+conditional UPDATE, so concurrent buyers of the same product can never take
+it below zero and only the rows being bought are locked. The same UPDATE
+counts the units sold that drive the listing's popularity sort.
+"""
+from sqlalchemy import update
+from models import db, Product
+
+
+class OutOfStockError(Exception):
+    """Raised when a product doesn't have enough stock left for a reservation"""
+
+    def __init__(self, product_id, name, requested, available):
+        self.product_id = product_id
+        self.name = name
+        self.requested = requested
+        self.available = available
+        super().__init__(f'Sorry, only {available} of {name} left in stock '
+                         f'(you requested {requested}).')
+
+
+def reserve_stock(lines):
+    """
+    Decrement stock for every (product_id, quantity) line in the current transaction.
+
+    Products are updated in primary key order so concurrent checkouts acquire
+    row locks in the same order and can't deadlock. Raises OutOfStockError on
+    the first product that can't be covered; the caller must roll back.
+
+    Returns {product_id: price}, read after the rows were locked so the prices
+    charged are the ones in effect when the stock was taken.
+    """
+    wanted = {}
+    for product_id, quantity in lines:
+        if quantity > 0:
+            wanted[product_id] = wanted.get(product_id, 0) + quantity
+
+    for product_id in sorted(wanted):
+        quantity = wanted[product_id]
+        result = db.session.execute(
+            update(Product)
+            .where(Product.product_id == product_id, Product.stock >= quantity)
+            .values(stock=Product.stock - quantity, units_sold=Product.units_sold + quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            row = (db.session.query(Product.name, Product.stock)
+                   .filter(Product.product_id == product_id).first())
+            name, available = row if row else ('this product', 0)
+            raise OutOfStockError(product_id, name, quantity, available)
+
+    if not wanted:
+        return {}
+    return dict(db.session.query(Product.product_id, Product.price)
+                .filter(Product.product_id.in_(wanted)).all())
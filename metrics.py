@@ -0,0 +1,185 @@
+"""
+Request Metrics
+Records per-endpoint latency histograms, SQL query counts and time, and
+template render time, and serves them in Prometheus text format on /metrics.
+Requests slower than SLOW_REQUEST_THRESHOLD are logged with their SQL.
+"""
+import hmac
+import ipaddress
+import threading
+import time
+from flask import Response, abort, current_app, g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class EndpointStats:
+    """Aggregated measurements for one endpoint"""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.latency_sum = 0.0
+        self.statuses = {}
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+
+    def observe(self, latency, status, queries, db_time, render_time):
+        self.count += 1
+        self.latency_sum += latency
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.bucket_counts[i] += 1
+                break
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.queries += queries
+        self.db_time += db_time
+        self.render_time += render_time
+
+
+class MetricsRegistry:
+    """Thread-safe store of EndpointStats keyed by endpoint name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def observe(self, endpoint, *args):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.observe(*args)
+
+    def render(self):
+        """Prometheus text exposition of everything recorded so far"""
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by endpoint',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            for endpoint, stats in endpoints:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.bucket_counts):
+                    cumulative += count
+                    lines.append(f'http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                lines.append(f'http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {stats.count}')
+                lines.append(f'http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {stats.latency_sum:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{endpoint="{endpoint}"}} {stats.count}')
+
+            lines += ['# HELP http_requests_total Requests by endpoint and status code',
+                      '# TYPE http_requests_total counter']
+            for endpoint, stats in endpoints:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'http_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+
+            for name, attr, help_text in (
+                    ('db_queries_total', 'queries', 'SQL statements executed'),
+                    ('db_query_duration_seconds_total', 'db_time', 'Time spent executing SQL'),
+                    ('template_render_seconds_total', 'render_time', 'Time spent rendering templates')):
+                lines += [f'# HELP {name} {help_text} by endpoint', f'# TYPE {name} counter']
+                for endpoint, stats in endpoints:
+                    value = getattr(stats, attr)
+                    value = f'{value:.6f}' if isinstance(value, float) else value
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def _request_state():
+    """Per-request accumulator, or None outside an instrumented request"""
+    if has_request_context():
+        return g.get('metrics')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _request_state() is not None:
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    state = _request_state()
+    starts = conn.info.get('metrics_query_start')
+    if state is None or not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    state['queries'] += 1
+    state['db_time'] += elapsed
+    if len(state['sql']) < current_app.config['METRICS_MAX_CAPTURED_SQL']:
+        state['sql'].append((elapsed, statement))
+
+
+def _before_render(sender, template, context, **extra):
+    state = _request_state()
+    if state is not None:
+        state['render_started'].append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    state = _request_state()
+    if state is not None and state['render_started']:
+        state['render_time'] += time.perf_counter() - state['render_started'].pop()
+
+
+def _is_local(address):
+    try:
+        ip = ipaddress.ip_address(address or '')
+    except ValueError:
+        return False
+    return ip.is_loopback or ip.is_private
+
+
+def metrics_view():
+    """Prometheus scrape endpoint; needs METRICS_TOKEN, or a loopback/private client if none is set"""
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(403)
+    elif not _is_local(request.remote_addr):
+        abort(403)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """Install the request hooks and the /metrics endpoint"""
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics = {'started': time.perf_counter(), 'queries': 0, 'db_time': 0.0,
+                     'render_time': 0.0, 'render_started': [], 'sql': []}
+
+    @app.teardown_request
+    def record_request_metrics(exc):
+        state = g.pop('metrics', None)
+        if state is None or request.endpoint == 'metrics':
+            return
+        latency = time.perf_counter() - state['started']
+        status = g.get('metrics_status', 500 if exc else 200)
+        endpoint = request.endpoint or 'unmatched'
+        registry.observe(endpoint, latency, status, state['queries'],
+                         state['db_time'], state['render_time'])
+        if latency >= app.config['SLOW_REQUEST_THRESHOLD']:
+            statements = '\n'.join(f'  [{elapsed * 1000:.1f}ms] {sql}' for elapsed, sql in state['sql'])
+            app.logger.warning('Slow request: %s %s -> %s in %.1fms (%d queries, %.1fms SQL, %.1fms templates)\n%s',
+                               request.method, request.full_path, status, latency * 1000, state['queries'],
+                               state['db_time'] * 1000, state['render_time'] * 1000, statements)
+
+    @app.after_request
+    def remember_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -3,10 +3,12 @@ Database Models
 """
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import hash_password, verify_password
+from sqlalchemy import DDL, event
 from datetime import datetime
+from db_routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(UserMixin, db.Model):
     """User model for authentication and user management"""
@@ -29,11 +31,11 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password = generate_password_hash(password)
+        self.password = hash_password(password)
     
     def check_password(self, password):
         """Check if provided password matches hashed password"""
-        return check_password_hash(self.password, password)
+        return verify_password(self.password, password)
     
     def __repr__(self):
         return f'<User {self.email}>'
@@ -42,15 +44,28 @@ class User(UserMixin, db.Model):
 class Product(db.Model):
     """Product model for items in the store"""
     __tablename__ = 'products'
+    __table_args__ = (
+        db.Index('idx_product_created', 'created_at', 'product_id'),
+        db.Index('idx_product_category_created', 'category', 'created_at', 'product_id'),
+        db.Index('idx_product_updated', 'updated_at'),
+        # Keyset pagination for the listing's price and popularity sorts, with and without a category
+        db.Index('idx_product_price', 'price', 'product_id'),
+        db.Index('idx_product_category_price', 'category', 'price', 'product_id'),
+        db.Index('idx_product_units_sold', 'units_sold', 'product_id'),
+        db.Index('idx_product_category_units_sold', 'category', 'units_sold', 'product_id'),
+    )
     
     product_id = db.Column(db.Integer, primary_key=True)
+    sku = db.Column(db.String(64), unique=True, nullable=True)  # supplier SKU, key for bulk imports
     name = db.Column(db.String(200), nullable=False)
     category = db.Column(db.String(50), nullable=False)  # food, flowers, heritage
     price = db.Column(db.Float, nullable=False)
     description = db.Column(db.Text, nullable=True)
     image = db.Column(db.String(255), nullable=True)
     stock = db.Column(db.Integer, default=100, nullable=False)
+    units_sold = db.Column(db.Integer, default=0, nullable=False)  # popularity sort, bumped at checkout
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # drives HTTP validators
     
     # Relationships
     cart_items = db.relationship('Cart', backref='product', lazy=True, cascade='all, delete-orphan')
@@ -60,9 +75,21 @@ class Product(db.Model):
         return f'<Product {self.name}>'
 
 
+# MySQL FULLTEXT index used by product search; other databases use the in-process index
+event.listen(
+    Product.__table__, 'after_create',
+    DDL('ALTER TABLE products ADD FULLTEXT INDEX ft_product_search (name, description, category)')
+    .execute_if(dialect='mysql')
+)
+
+
 class Cart(db.Model):
     """Shopping cart model"""
     __tablename__ = 'cart'
+    __table_args__ = (
+        # One line per product; cart writes upsert against this key
+        db.UniqueConstraint('user_id', 'product_id', name='uq_cart_user_product'),
+    )
     
     cart_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
@@ -77,6 +104,11 @@ class Cart(db.Model):
 class Order(db.Model):
     """Order model for customer orders"""
     __tablename__ = 'orders'
+    __table_args__ = (
+        db.Index('idx_order_date_id', 'order_date', 'order_id'),
+        db.Index('idx_order_user_date', 'user_id', 'order_date', 'order_id'),
+        db.Index('idx_order_status_date', 'status', 'order_date', 'order_id'),
+    )
     
     order_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
@@ -106,3 +138,75 @@ class OrderItem(db.Model):
     
     def __repr__(self):
         return f'<OrderItem {self.order_item_id}>'
+
+
+class StoreStat(db.Model):
+    """Dashboard counter, split across shards so concurrent writers rarely contend"""
+    __tablename__ = 'store_stats'
+    
+    name = db.Column(db.String(50), primary_key=True)  # products, orders, customers, revenue, orders:<status>
+    shard = db.Column(db.Integer, primary_key=True, default=0)
+    value = db.Column(db.Float, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<StoreStat {self.name}[{self.shard}]>'
+
+
+class OutboxEvent(db.Model):
+    """
+    Side effect to run after a transaction commits, written in that same
+    transaction. One row per (event, handler) so each handler retries on its own.
+    """
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        db.Index('idx_outbox_status_available', 'status', 'available_at'),
+    )
+    
+    event_id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False)  # e.g. order.placed
+    handler = db.Column(db.String(100), nullable=False)
+    idempotency_key = db.Column(db.String(200), unique=True, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, processing, done, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # next attempt, or lease expiry
+    claimed_by = db.Column(db.String(64), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<OutboxEvent {self.event_id} {self.event_type} -> {self.handler}>'
+
+
+class SalesDaily(db.Model):
+    """
+    Daily sales rollup per category and order status. Category '*' holds
+    whole-order totals, so order counts aren't double counted across
+    categories. Sharded like StoreStat; readers sum the shards.
+    """
+    __tablename__ = 'sales_daily'
+    
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, default=0)
+    orders = db.Column(db.Integer, default=0, nullable=False)
+    units = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<SalesDaily {self.day} {self.category} {self.status}[{self.shard}]>'
+
+
+class ProductSalesDaily(db.Model):
+    """Daily units and revenue per product, excluding cancelled orders"""
+    __tablename__ = 'product_sales_daily'
+    
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)  # no FK: history outlives deleted products
+    units = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<ProductSalesDaily {self.day} #{self.product_id}>'
@@ -0,0 +1,24 @@
+"""
+Order Events
+Outbox handlers for order side effects. They run in `flask outbox-worker`,
+never in the checkout request; register new ones with @handles.
+"""
+import logging
+from flask import current_app
+from models import Product
+from outbox import handles
+
+logger = logging.getLogger(__name__)
+
+
+@handles('order.placed')
+def low_stock_alert(payload, idempotency_key):
+    """Warn the store when an order leaves any of its products nearly sold out"""
+    product_ids = [item['product_id'] for item in payload['items']]
+    threshold = current_app.config['LOW_STOCK_THRESHOLD']
+    low = (Product.query
+           .filter(Product.product_id.in_(product_ids), Product.stock <= threshold)
+           .order_by(Product.product_id).all())
+    for product in low:
+        logger.warning('Low stock after order %s: %s (#%s) has %d left',
+                       payload['order_id'], product.name, product.product_id, product.stock)
@@ -0,0 +1,190 @@
+"""
+Transactional Outbox
+Side effects of a write (emails, alerts, notifications) are recorded as rows
+in the same transaction as the write itself and run later by a worker, so a
+request never waits on them and none are lost if the process dies after
+committing.
+
+    @handles('order.placed')
+    def send_confirmation(payload, idempotency_key): ...
+
+    publish('order.placed', {'order_id': 7}, key='order:7')  # before commit
+
+publish() writes one row per registered handler, keyed by
+"<key>:<handler>": the unique key stops an event from being recorded twice,
+and each handler retries independently. Delivery is at-least-once: handlers receive
+the idempotency key to pass on to anything that must not happen twice.
+
+`flask outbox-worker` polls the table, claims batches under a lease (rows of
+a crashed worker become claimable again once it expires), runs them in a
+thread pool, and reschedules failures with exponential backoff until
+OUTBOX_MAX_ATTEMPTS.
+"""
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update
+from models import db, OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}  # event_type -> {handler name: function}
+
+
+def handles(event_type):
+    """Register a function to run for every published `event_type`"""
+    def register(func):
+        name = f'{func.__module__}.{func.__name__}'
+        _handlers.setdefault(event_type, {})[name] = func
+        return func
+    return register
+
+
+def publish(event_type, payload, key):
+    """Add the event's outbox rows to the current transaction (caller commits)"""
+    body = json.dumps(payload, default=str)
+    for name in _handlers.get(event_type, ()):
+        db.session.add(OutboxEvent(event_type=event_type, handler=name,
+                                   idempotency_key=f'{key}:{name}', payload=body))
+
+
+def _retry_delay(attempts):
+    config = current_app.config
+    return min(config['OUTBOX_RETRY_BASE'] * 2 ** (attempts - 1), config['OUTBOX_RETRY_MAX'])
+
+
+def claim_batch(claim_id, limit):
+    """
+    Lease up to `limit` due events under `claim_id` and return them.
+
+    Claiming is a conditional UPDATE on rows still pending (or whose lease
+    has lapsed), so concurrent workers never receive the same row. The
+    attempt is counted here, so an event that keeps killing its worker
+    still runs out of attempts: a lapsed lease on its last attempt marks
+    it failed.
+    """
+    config = current_app.config
+    now = datetime.utcnow()
+    abandoned = db.session.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.status == 'processing', OutboxEvent.available_at <= now,
+               OutboxEvent.attempts >= config['OUTBOX_MAX_ATTEMPTS'])
+        .values(status='failed', claimed_by=None, last_error='Lease expired during the last attempt')
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if abandoned:
+        logger.error('%d outbox events failed after their worker died on the last attempt', abandoned)
+    claimable = (OutboxEvent.status.in_(('pending', 'processing')),
+                 OutboxEvent.available_at <= now,
+                 OutboxEvent.attempts < config['OUTBOX_MAX_ATTEMPTS'])
+    due = (db.session.query(OutboxEvent.event_id)
+           .filter(*claimable)
+           .order_by(OutboxEvent.available_at, OutboxEvent.event_id)
+           .limit(limit).all())
+    if not due:
+        db.session.commit()
+        return []
+    db.session.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.event_id.in_([row.event_id for row in due]), *claimable)
+        .values(status='processing', claimed_by=claim_id, attempts=OutboxEvent.attempts + 1,
+                available_at=now + timedelta(seconds=config['OUTBOX_LEASE_SECONDS']))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return (OutboxEvent.query
+            .filter(OutboxEvent.claimed_by == claim_id, OutboxEvent.status == 'processing')
+            .order_by(OutboxEvent.event_id).all())
+
+
+def _run_handler(app, event_type, handler, payload, idempotency_key):
+    """Run one handler in a pool thread; returns an error string or None"""
+    func = _handlers.get(event_type, {}).get(handler)
+    if func is None:
+        return f'No handler {handler} registered for {event_type}'
+    with app.app_context():
+        try:
+            func(json.loads(payload), idempotency_key)
+            return None
+        except Exception as e:
+            logger.exception('Outbox handler %s failed for %s', handler, idempotency_key)
+            return f'{type(e).__name__}: {e}'
+
+
+def process_batch(worker_id, executor):
+    """Claim, run and record one batch; returns the number of events handled"""
+    app = current_app._get_current_object()
+    claim_id = f'{worker_id}:{uuid.uuid4().hex[:12]}'
+    events = claim_batch(claim_id, app.config['OUTBOX_BATCH_SIZE'])
+    if not events:
+        return 0
+    jobs = [(event, executor.submit(_run_handler, app, event.event_type, event.handler,
+                                    event.payload, event.idempotency_key))
+            for event in events]
+
+    now = datetime.utcnow()
+    done = []
+    for event, job in jobs:
+        error = job.result()
+        if error is None:
+            done.append(event.event_id)
+            continue
+        # Only while this claim still holds the row; after the lease lapses another worker may own it
+        values = {'last_error': error[:2000], 'claimed_by': None}
+        if event.attempts >= app.config['OUTBOX_MAX_ATTEMPTS']:
+            values['status'] = 'failed'
+            logger.error('Outbox event %s gave up after %d attempts', event.idempotency_key, event.attempts)
+        else:
+            values.update(status='pending', available_at=now + timedelta(seconds=_retry_delay(event.attempts)))
+        db.session.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.event_id == event.event_id, OutboxEvent.claimed_by == claim_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+    if done:
+        db.session.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.event_id.in_(done), OutboxEvent.claimed_by == claim_id)
+            .values(status='done', processed_at=now, claimed_by=None)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    return len(events)
+
+
+def prune(retention_days):
+    """Delete delivered events older than the retention period"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = (OutboxEvent.query
+               .filter(OutboxEvent.status == 'done', OutboxEvent.processed_at < cutoff)
+               .delete(synchronize_session=False))
+    db.session.commit()
+    return deleted
+
+
+def run_worker(once=False, log=print):
+    """Drain the outbox until interrupted (or until it is empty, with `once`)"""
+    config = current_app.config
+    worker_id = uuid.uuid4().hex[:16]
+    last_prune = None
+    with ThreadPoolExecutor(max_workers=config['OUTBOX_WORKER_THREADS']) as executor:
+        while True:
+            if last_prune is None or time.monotonic() - last_prune > config['OUTBOX_PRUNE_INTERVAL']:
+                pruned = prune(config['OUTBOX_RETENTION_DAYS'])
+                if pruned:
+                    log(f"Pruned {pruned} delivered outbox events")
+                last_prune = time.monotonic()
+            handled = process_batch(worker_id, executor)
+            db.session.remove()
+            if handled:
+                log(f"Processed {handled} outbox events")
+                continue
+            if once:
+                return
+            time.sleep(config['OUTBOX_POLL_INTERVAL'])
+
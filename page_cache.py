@@ -0,0 +1,133 @@
+"""
+Full-Page Cache
+Caches the rendered HTML of anonymous catalog pages, keyed by path and query
+string, so traffic spikes are served without templates or queries.
+
+- An entry is fresh for PAGE_CACHE_TTL seconds while the catalog version it
+  was rendered from is current. After that it is served stale (for up to
+  PAGE_CACHE_STALE_TTL) while a single background render replaces it.
+- Misses are coalesced: concurrent requests for the same page wait for one
+  render instead of all rendering it. Coalescing is per worker process.
+- purge_pages() (called from the admin product routes) retires every entry
+  outright; purged pages are re-rendered, never served stale. Stock changes
+  from checkout only move the catalog version, so they refresh in the
+  background.
+"""
+import threading
+import time
+import zlib
+from functools import wraps
+from flask import copy_current_request_context, current_app, g, make_response, request, session
+from flask_login import current_user
+from cache import get_cache
+from catalog import catalog_version
+from db_routing import read_primary
+
+GENERATION_KEY = 'page:generation'
+LOCK_STRIPES = 64
+
+_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+
+def _lock_for(key):
+    return _locks[zlib.crc32(key.encode('utf-8')) % LOCK_STRIPES]
+
+
+def _generation():
+    generation = get_cache().get(GENERATION_KEY)
+    if generation is None:
+        generation = time.time()
+        get_cache().set(GENERATION_KEY, generation, ttl=365 * 24 * 3600)
+    return generation
+
+
+def purge_pages():
+    """Retire every cached page; the next request for each renders it afresh"""
+    get_cache().set(GENERATION_KEY, time.time(), ttl=365 * 24 * 3600)
+
+
+def _state(entry, generation, version):
+    """'fresh', 'stale' or None (unusable) for a cached entry"""
+    if entry is None or entry['generation'] != generation:
+        return None
+    age = time.time() - entry['stored_at']
+    config = current_app.config
+    if age < config['PAGE_CACHE_TTL'] and entry['version'] == version:
+        return 'fresh'
+    if age < config['PAGE_CACHE_TTL'] + config['PAGE_CACHE_STALE_TTL']:
+        return 'stale'
+    return None
+
+
+def _render(view, args, kwargs, key, generation, version):
+    """Run the view against the primary and store its output if it is safe to share"""
+    with read_primary():
+        response = make_response(view(*args, **kwargs))
+    if response.status_code == 200 and not session.modified and not response.is_streamed:
+        config = current_app.config
+        get_cache().set(key, {
+            'body': response.get_data(as_text=True),
+            'mimetype': response.mimetype,
+            'generation': generation,
+            'version': version,
+            'stored_at': time.time(),
+        }, ttl=config['PAGE_CACHE_TTL'] + config['PAGE_CACHE_STALE_TTL'])
+    return response
+
+
+def _cached_response(entry, status):
+    response = make_response(entry['body'])
+    response.mimetype = entry['mimetype']
+    response.headers['X-Cache'] = status
+    return response
+
+
+def _refresh_in_background(view, args, kwargs, key, generation, version, lock):
+    @copy_current_request_context
+    def refresh():
+        try:
+            _render(view, args, kwargs, key, generation, version)
+        except Exception:
+            current_app.logger.exception('Background page refresh failed for %s', key)
+        finally:
+            lock.release()
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def cached_page(view):
+    """Serve anonymous GETs of this view from the full-page cache"""
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        if (not current_app.config['PAGE_CACHE_ENABLED'] or request.method not in ('GET', 'HEAD')
+                or current_user.is_authenticated or session.get('_flashes')):
+            return view(*args, **kwargs)
+
+        cache = get_cache()
+        key = f'page:{request.full_path}'
+        generation, version = _generation(), catalog_version()
+        entry = cache.get(key)
+        state = _state(entry, generation, version)
+        if state == 'fresh':
+            return _cached_response(entry, 'HIT')
+
+        lock = _lock_for(key)
+        if state == 'stale':
+            # The catalog ETag would describe the new version, not this body
+            g.page_cache_stale = True
+            if lock.acquire(blocking=False):
+                _refresh_in_background(view, args, kwargs, key, generation, version, lock)
+            return _cached_response(entry, 'STALE')
+
+        acquired = lock.acquire(timeout=current_app.config['PAGE_CACHE_LOCK_TIMEOUT'])
+        try:
+            entry = cache.get(key)
+            if _state(entry, generation, version) == 'fresh':
+                return _cached_response(entry, 'HIT')
+            response = _render(view, args, kwargs, key, generation, version)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        finally:
+            if acquired:
+                lock.release()
+    return decorated_function
@@ -0,0 +1,157 @@
+"""
+Keyset (cursor) Pagination
+Pages through listings ordered by a sort column (a timestamp, price or
+counter) plus primary key
+"""
+import base64
+import binascii
+from datetime import datetime
+from flask import current_app, request, url_for
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(value, pk):
+    """Encode a (sort value, primary key) pair as an opaque URL-safe cursor"""
+    raw = f"{value.isoformat() if isinstance(value, datetime) else repr(value)}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, parse=datetime.fromisoformat):
+    """Decode a cursor back into (sort value, primary key), or None if invalid"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        value, pk = raw.rsplit('|', 1)
+        return parse(value), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def _cursor_parser(column):
+    python_type = column.type.python_type
+    return datetime.fromisoformat if python_type is datetime else python_type
+
+
+def get_per_page():
+    """Read the requested page size from the query string, clamped to config limits"""
+    default = current_app.config['PER_PAGE']
+    maximum = current_app.config['MAX_PER_PAGE']
+    per_page = request.args.get('per_page', default, type=int)
+    return max(1, min(per_page, maximum))
+
+
+class KeysetPage:
+    """One page of results plus the cursors needed to move forwards and backwards"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, per_page=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def _url(self, **cursor):
+        """Build a URL to the current view, keeping filters but replacing the cursor"""
+        args = request.args.to_dict()
+        args.pop('after', None)
+        args.pop('before', None)
+        args.update(cursor)
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+    def next_url(self):
+        return self._url(after=self.next_cursor)
+
+    def prev_url(self):
+        return self._url(before=self.prev_cursor)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def paginate(query, sort_column, pk_column, per_page, after=None, before=None, descending=True):
+    """
+    Return a KeysetPage of `query` ordered by (sort_column, pk_column),
+    descending unless `descending` is False.
+
+    `after` fetches the page of rows that follow that cursor, `before` the
+    page of rows preceding it. Each page costs one indexed range scan of
+    per_page + 1 rows no matter how deep into the listing it is.
+    """
+    sort_attr = sort_column.key
+    pk_attr = pk_column.key
+    parse = _cursor_parser(sort_column)
+
+    def beyond(key, ascending):
+        value, pk = key
+        if ascending:
+            return or_(sort_column > value, and_(sort_column == value, pk_column > pk))
+        return or_(sort_column < value, and_(sort_column == value, pk_column < pk))
+
+    def ordering(ascending):
+        return (sort_column.asc(), pk_column.asc()) if ascending else (sort_column.desc(), pk_column.desc())
+
+    def cursor_for(row):
+        return encode_cursor(getattr(row, sort_attr), getattr(row, pk_attr))
+
+    before_key = decode_cursor(before, parse)
+    if before_key:
+        rows = (query.filter(beyond(before_key, ascending=descending))
+                .order_by(*ordering(ascending=descending))
+                .limit(per_page + 1)
+                .all())
+        has_more = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        if not items:
+            return KeysetPage(items, per_page=per_page)
+        return KeysetPage(items,
+                          next_cursor=cursor_for(items[-1]),
+                          prev_cursor=cursor_for(items[0]) if has_more else None,
+                          per_page=per_page)
+
+    after_key = decode_cursor(after, parse)
+    if after_key:
+        query = query.filter(beyond(after_key, ascending=not descending))
+
+    rows = (query.order_by(*ordering(ascending=not descending))
+            .limit(per_page + 1)
+            .all())
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+    if not items:
+        return KeysetPage(items, per_page=per_page)
+    return KeysetPage(items,
+                      next_cursor=cursor_for(items[-1]) if has_more else None,
+                      prev_cursor=cursor_for(items[0]) if after_key else None,
+                      per_page=per_page)
+
+
+def paginate_ranked(ranked_ids, loader, per_page, after=None, before=None):
+    """
+    Return a KeysetPage over an already-ranked, bounded list of ids.
+
+    Relevance order has no stable column to seek on, so the cursors here are
+    positions in `ranked_ids`. `loader` turns one page of ids into rows.
+    """
+    start = 0
+    if before and before.isdigit():
+        start = max(0, int(before) - per_page)
+    elif after and after.isdigit():
+        start = min(int(after), len(ranked_ids))
+
+    end = start + per_page
+    return KeysetPage(loader(ranked_ids[start:end]),
+                      next_cursor=str(end) if end < len(ranked_ids) else None,
+                      prev_cursor=str(start) if start > 0 else None,
+                      per_page=per_page)
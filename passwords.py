@@ -0,0 +1,87 @@
+"""
+Password Hashing
+Runs werkzeug's password hashing in a small process pool so a burst of logins
+or signups doesn't hold the GIL in the web worker, and checks stored hashes
+against the configured algorithm/cost so they can be upgraded on login.
+
+The pool uses the 'spawn' start method, so scripts that hash passwords must
+keep their entry point under `if __name__ == '__main__':`.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingBusyError(Exception):
+    """Raised when too many hashes are already queued to accept another one"""
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = None
+_method_prefixes = {}
+
+
+def _get_pool():
+    """Return this process's hashing pool, recreating it after a fork"""
+    global _pool, _pool_pid, _slots
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(current_app.config['PASSWORD_HASH_MAX_PENDING'])
+        return _pool
+
+
+def _run(func, *args):
+    pool = _get_pool()
+    if pool is None:
+        return func(*args)
+    timeout = current_app.config['PASSWORD_HASH_TIMEOUT']
+    slots = _slots
+    if not slots.acquire(timeout=timeout):
+        raise HashingBusyError('Password hashing queue is full')
+    try:
+        future = pool.submit(func, *args)
+    except BaseException:
+        slots.release()
+        raise
+    # The slot is held until the hash finishes, even if this request stops waiting for it
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=timeout)
+    except FuturesTimeoutError:
+        future.cancel()
+        raise HashingBusyError('Password hashing timed out') from None
+
+
+def hash_password(password):
+    """Hash a password with the configured method"""
+    return _run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def verify_password(pwhash, password):
+    """Check a password against a stored hash"""
+    return _run(check_password_hash, pwhash, password)
+
+
+def _method_prefix(method):
+    """The method part werkzeug writes before the first '$' for `method`"""
+    prefix = _method_prefixes.get(method)
+    if prefix is None:
+        prefix = generate_password_hash('', method).split('$', 1)[0]
+        _method_prefixes[method] = prefix
+    return prefix
+
+
+def needs_rehash(pwhash):
+    """True if a stored hash was made with a different algorithm or cost than configured"""
+    return pwhash.split('$', 1)[0] != _method_prefix(current_app.config['PASSWORD_HASH_METHOD'])
@@ -0,0 +1,209 @@
+"""
+Bulk Product Import/Export
+Streams supplier catalogs in CSV or JSON Lines format in constant memory.
+Imported rows are validated and upserted on SKU in batched multi-row
+statements; exports stream rows straight from a server-side cursor.
+"""
+import csv
+import io
+import json
+import math
+from sqlalchemy.dialects import mysql, sqlite
+from models import db, Product
+from cache import get_cache
+from search import reset_search_engine
+from stats import reconcile_stats
+
+FIELDS = ['sku', 'name', 'category', 'price', 'description', 'image', 'stock']
+CATEGORIES = ('food', 'flowers', 'heritage')
+MAX_REPORTED_ERRORS = 20
+SKU_MAX_LENGTH = 64
+MAX_PRICE = 10 ** 8  # products.price is DECIMAL(10, 2)
+IMAGE_MAX_LENGTH = 255
+
+
+class ImportResult:
+    """Counters and the first few validation errors from an import run"""
+
+    def __init__(self):
+        self.processed = 0
+        self.upserted = 0
+        self.errors = []
+        self.error_count = 0
+
+    def add_error(self, line_no, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'line {line_no}: {message}')
+
+
+def detect_format(filename):
+    """Pick 'csv' or 'jsonl' from a file name"""
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def iter_records(stream, fmt):
+    """Yield (line number, raw record dict) from a text stream"""
+    if fmt == 'jsonl':
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, ValueError(f'invalid JSON ({e.msg})')
+    else:
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+
+
+def _text(record, field):
+    """An optional text field as a string or None; JSON objects and arrays are rejected"""
+    value = record.get(field)
+    if value is None or value == '':
+        return None
+    if isinstance(value, (dict, list)):
+        raise ValueError(f'{field} must be text')
+    return str(value)
+
+
+def validate_record(record):
+    """Return a clean row dict for the products table, or raise ValueError"""
+    if not isinstance(record, dict):
+        raise ValueError('record must be an object')
+    sku = str(record.get('sku') or '').strip()
+    if len(sku) > SKU_MAX_LENGTH:
+        raise ValueError(f'sku must be at most {SKU_MAX_LENGTH} characters')
+    name = str(record.get('name') or '').strip()
+    category = str(record.get('category') or '').strip().lower()
+    if not sku:
+        raise ValueError('sku is required')
+    if not name:
+        raise ValueError('name is required')
+    if category not in CATEGORIES:
+        raise ValueError(f'unknown category {category!r}')
+    try:
+        price = float(record.get('price'))
+    except (TypeError, ValueError):
+        raise ValueError('price must be a number')
+    if not math.isfinite(price):
+        raise ValueError('price must be a finite number')
+    if price < 0:
+        raise ValueError('price must not be negative')
+    if price >= MAX_PRICE:
+        raise ValueError(f'price must be below {MAX_PRICE}')
+    stock = record.get('stock')
+    try:
+        stock = 100 if stock in (None, '') else int(stock)
+    except (TypeError, ValueError):
+        raise ValueError('stock must be an integer')
+    if stock < 0:
+        raise ValueError('stock must not be negative')
+    description = _text(record, 'description')
+    image = _text(record, 'image')
+    if image is not None and len(image) > IMAGE_MAX_LENGTH:
+        raise ValueError(f'image must be at most {IMAGE_MAX_LENGTH} characters')
+    return {
+        'sku': sku,
+        'name': name[:200],
+        'category': category,
+        'price': price,
+        'description': description,
+        'image': image,
+        'stock': stock,
+    }
+
+
+def upsert_products(rows):
+    """
+    Insert or update a batch of product rows keyed on SKU.
+
+    The statement is compiled once and executed with the whole batch as its
+    parameter list; PyMySQL rewrites that into a single multi-row
+    INSERT ... ON DUPLICATE KEY UPDATE, SQLite runs it as one prepared statement.
+    """
+    table = Product.__table__
+    update_columns = [column for column in FIELDS if column != 'sku'] + ['updated_at']
+    dialect = db.session.get_bind(mapper=Product).dialect.name
+    if dialect == 'mysql':
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in update_columns})
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=['sku'],
+                                          set_={column: stmt.excluded[column] for column in update_columns})
+    else:
+        raise RuntimeError(f'Bulk upsert is not supported on {dialect}')
+    db.session.execute(stmt, rows)
+
+
+def import_products(stream, fmt, batch_size=1000, progress=None):
+    """
+    Validate and upsert every record in `stream`, committing once per batch.
+
+    `progress`, if given, is called with the running ImportResult after each
+    batch. Invalid records are skipped and reported in the result.
+    """
+    result = ImportResult()
+    batch = []
+
+    def flush():
+        upsert_products(batch)
+        db.session.commit()
+        result.upserted += len(batch)
+        batch.clear()
+        if progress:
+            progress(result)
+
+    for line_no, record in iter_records(stream, fmt):
+        result.processed += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            batch.append(validate_record(record))
+        except ValueError as e:
+            result.add_error(line_no, str(e))
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return result
+
+
+def refresh_after_import():
+    """
+    Bring caches, the search index and dashboard counters in line with the new catalog.
+
+    Clearing a Redis cache reaches every worker, including its search
+    generation; a memory cache only belongs to this process, so other
+    workers catch up as their entries and search index expire.
+    """
+    get_cache().clear()
+    reset_search_engine()
+    reconcile_stats()
+
+
+def export_products(fmt, batch_size=1000):
+    """Yield the whole catalog as CSV or JSON Lines text chunks, one batch at a time"""
+    columns = [getattr(Product, field) for field in FIELDS]
+    rows = (db.session.query(*columns)
+            .order_by(Product.product_id)
+            .execution_options(yield_per=batch_size))
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(FIELDS)
+
+    for count, row in enumerate(rows, start=1):
+        if fmt == 'jsonl':
+            buffer.write(json.dumps(dict(zip(FIELDS, row))) + '\n')
+        else:
+            writer.writerow(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,109 @@
+"""
+Query Counting
+Counts the SQL statements issued inside a block, flags statements repeated
+with different parameters (the signature of an N+1 lazy-load loop), and
+provides assertions for enforcing per-view query budgets in tests.
+
+    with QueryCounter() as queries:
+        client.get('/cart')
+    assert queries.count <= 3
+
+    with assert_max_queries(3):
+        client.get('/cart')
+"""
+import threading
+from contextlib import ContextDecorator, contextmanager
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_local = threading.local()
+
+
+def _active_counters():
+    stack = getattr(_local, 'counters', None)
+    if stack is None:
+        stack = _local.counters = []
+    return stack
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active_counters():
+        counter.statements.append(statement)
+
+
+class QueryCounter(ContextDecorator):
+    """Collects every statement executed on this thread while active"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __enter__(self):
+        self.statements = []
+        _active_counters().append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _active_counters().remove(self)
+        return False
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self, min_repeats=2, selects_only=True):
+        """
+        [(statement, times)] for identical SQL executed at least `min_repeats` times.
+
+        Only SELECTs are considered by default: a lazy-load loop shows up as the
+        same SELECT per row, while per-row conditional writes are deliberate.
+        """
+        seen = {}
+        for statement in self.statements:
+            if selects_only and not statement.lstrip().upper().startswith('SELECT'):
+                continue
+            seen[statement] = seen.get(statement, 0) + 1
+        return sorted(((sql, n) for sql, n in seen.items() if n >= min_repeats),
+                      key=lambda item: -item[1])
+
+    def report(self):
+        """Human-readable listing of the captured statements"""
+        return '\n'.join(f'{i}. {sql}' for i, sql in enumerate(self.statements, start=1))
+
+
+@contextmanager
+def assert_max_queries(budget):
+    """Fail with the captured SQL if the block issues more than `budget` statements"""
+    with QueryCounter() as counter:
+        yield counter
+    if counter.count > budget:
+        raise AssertionError(f'{counter.count} queries executed, budget is {budget}:\n{counter.report()}')
+
+
+def assert_view_query_budget(client, path, budget, method='get', **kwargs):
+    """Request `path` with a Flask test client and assert it stays within `budget` queries"""
+    with assert_max_queries(budget):
+        response = getattr(client, method.lower())(path, **kwargs)
+    return response
+
+
+def init_app(app):
+    """In development, log a warning for requests that repeat the same statement"""
+    if not app.config['N_PLUS_ONE_DETECTION']:
+        return
+
+    @app.before_request
+    def start_query_counter():
+        g.query_counter = QueryCounter().__enter__()
+
+    @app.teardown_request
+    def check_query_counter(exc):
+        counter = g.pop('query_counter', None)
+        if counter is None:
+            return
+        counter.__exit__(None, None, None)
+        threshold = app.config['N_PLUS_ONE_THRESHOLD']
+        for statement, times in counter.repeated(threshold):
+            app.logger.warning('Possible N+1 query in %s: statement ran %d times\n  %s',
+                               request.endpoint or request.path, times, statement)
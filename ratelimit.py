@@ -0,0 +1,208 @@
+"""
+Rate Limiting and Load Shedding
+Keeps bursts against the expensive endpoints (password hashing, search,
+checkout) from slowing the store down for everyone else.
+
+- Rate limits are token buckets per client IP and per signed-in user, set
+  per endpoint in RATELIMIT_POLICIES. A request that finds its bucket empty
+  gets 429 with Retry-After. Buckets live in process memory, or in Redis
+  (RATELIMIT_BACKEND = 'redis') so every worker shares them.
+- The load shedder counts the requests in flight in this worker process.
+  Above LOAD_SHED_POLICY_IN_FLIGHT the rate-limited endpoints are turned away
+  with 503 and Retry-After, so cheap browsing pages keep working; above
+  LOAD_SHED_MAX_IN_FLIGHT every request is.
+
+init_app() is called right after metrics, so rejected requests are still
+measured but reach no other request hook and cost no database work. If the
+shared backend is unreachable, requests are allowed.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, jsonify, request
+from flask_login import current_user
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+
+# Endpoints that are never limited or shed
+EXEMPT_ENDPOINTS = ('static', 'metrics')
+
+
+class MemoryBuckets:
+    """Token buckets in process memory; the least recently used are dropped beyond max_keys"""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, per_seconds, cost=1):
+        """Spend `cost` tokens; returns (allowed, seconds until enough tokens are available)"""
+        rate = capacity / per_seconds
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+
+# Refill, spend and store one bucket atomically; timed by the Redis clock so workers agree
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+
+class RedisBuckets:
+    """
+    Token buckets shared by every worker through Redis (requires the `redis` package).
+
+    Keys live outside the cache's 'ecommerce:' namespace, so clearing the
+    cache (e.g. after a product import) doesn't refill every bucket.
+    """
+
+    def __init__(self, url, prefix='ecommerce-ratelimit:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(TAKE_SCRIPT)
+
+    def take(self, key, capacity, per_seconds, cost=1):
+        allowed, wait = self._take(keys=[self.prefix + key], args=[capacity, capacity / per_seconds, cost])
+        return bool(allowed), float(wait)
+
+
+def create_backend(config):
+    """Build the bucket store selected by RATELIMIT_BACKEND"""
+    if config['RATELIMIT_BACKEND'] == 'redis':
+        return RedisBuckets(config['RATELIMIT_REDIS_URL'])
+    return MemoryBuckets(max_keys=config['RATELIMIT_MAX_KEYS'])
+
+
+def get_backend():
+    """Return the bucket store for the current app, creating it on first use"""
+    backend = current_app.extensions.get('ratelimit')
+    if backend is None:
+        backend = create_backend(current_app.config)
+        current_app.extensions['ratelimit'] = backend
+    return backend
+
+
+def _applies(policy):
+    methods = policy.get('methods')
+    if methods and request.method not in methods:
+        return False
+    return all(request.args.get(name) for name in policy.get('when_args', ()))
+
+
+def _identity(scope):
+    if scope == 'ip':
+        return request.remote_addr or 'unknown'
+    if scope == 'user':
+        return str(current_user.user_id) if current_user.is_authenticated else None
+    raise ValueError(f'Unknown rate limit scope {scope!r}')
+
+
+def _rejection(error_class, message, retry_after):
+    """An `error_class` response with Retry-After, as JSON for API clients"""
+    seconds = max(1, math.ceil(retry_after))
+    if request.is_json or request.accept_mimetypes.best == 'application/json':
+        response = jsonify({'error': message})
+        response.status_code = error_class.code
+        response.headers['Retry-After'] = str(seconds)
+        return response
+    return error_class(description=message, retry_after=seconds).get_response()
+
+
+def _policy(endpoint):
+    """The endpoint's rate limit policy if it covers this request"""
+    policy = current_app.config['RATELIMIT_POLICIES'].get(endpoint)
+    return policy if policy and _applies(policy) else None
+
+
+def check_rate_limits(endpoint, policy):
+    """A 429 response if this request exceeds one of the policy's limits, else None"""
+    backend = get_backend()
+    for scope, (capacity, per_seconds) in policy['limits'].items():
+        identity = _identity(scope)
+        if identity is None:
+            continue
+        try:
+            allowed, retry_after = backend.take(f'{endpoint}:{scope}:{identity}', capacity, per_seconds)
+        except Exception:
+            current_app.logger.exception('Rate limit backend failed; allowing request')
+            return None
+        if not allowed:
+            return _rejection(TooManyRequests, 'Too many requests. Please slow down and try again shortly.',
+                              retry_after)
+    return None
+
+
+class InFlightCounter:
+    """Requests currently being handled by this process"""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.value += 1
+            return self.value
+
+    def leave(self):
+        with self._lock:
+            self.value -= 1
+
+
+def init_app(app):
+    """Shed load and enforce rate limits before the view (and later request hooks) run"""
+    in_flight = app.extensions['in_flight'] = InFlightCounter()
+
+    @app.before_request
+    def guard_request():
+        endpoint = request.endpoint
+        if endpoint in EXEMPT_ENDPOINTS:
+            return None
+        g.in_flight = True
+        current = in_flight.enter()
+        config = app.config
+        policy = _policy(endpoint)
+        if config['LOAD_SHED_ENABLED'] and (
+                current > config['LOAD_SHED_MAX_IN_FLIGHT']
+                or (policy is not None and current > config['LOAD_SHED_POLICY_IN_FLIGHT'])):
+            return _rejection(ServiceUnavailable, 'The store is very busy right now. Please try again in a moment.',
+                              config['LOAD_SHED_RETRY_AFTER'])
+        if config['RATELIMIT_ENABLED'] and policy is not None:
+            return check_rate_limits(endpoint, policy)
+        return None
+
+    @app.teardown_request
+    def release_slot(exc):
+        if g.pop('in_flight', False):
+            in_flight.leave()
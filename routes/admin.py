@@ -2,11 +2,23 @@
 Admin Routes
 Handles admin dashboard, product management, and order management
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from functools import wraps
-from models import db, Product, Order, User
+from models import db, Product, Order, OrderItem, User
+from sqlalchemy.orm import joinedload, selectinload
 from werkzeug.utils import secure_filename
+from db_routing import read_replica
+from pagination import paginate, get_per_page
+from search import get_search_engine
+from catalog import invalidate_product
+from page_cache import purge_pages
+from stats import bump, get_stats, record_order_status_change
+import analytics
+from images import InvalidImageError, save_upload
+import product_io
+from datetime import datetime, timedelta
+import io
 import os
 
 admin_bp = Blueprint('admin', __name__)
@@ -23,27 +35,35 @@ def admin_required(f):
     return decorated_function
 
 
+def _submitted_image(current=None):
+    """The uploaded image's URL if a file was sent, else the image URL field"""
+    upload = request.files.get('image_file')
+    if upload and upload.filename:
+        return save_upload(upload)
+    return request.form.get('image', current) or None
+
+
 @admin_bp.route('/admin/dashboard')
 @admin_required
 def dashboard():
     """Admin dashboard"""
-    total_products = Product.query.count()
-    total_orders = Order.query.count()
-    total_users = User.query.filter_by(role='customer').count()
-    pending_orders = Order.query.filter_by(status='pending').count()
+    stats = get_stats()
     
-    recent_orders = Order.query.order_by(Order.order_date.desc()).limit(10).all()
+    recent_orders = (Order.query.options(joinedload(Order.user))
+                     .order_by(Order.order_date.desc()).limit(10).all())
     
     return render_template('admin/dashboard.html',
-                         total_products=total_products,
-                         total_orders=total_orders,
-                         total_users=total_users,
-                         pending_orders=pending_orders,
+                         total_products=stats['products'],
+                         total_orders=stats['orders'],
+                         total_users=stats['customers'],
+                         pending_orders=stats['orders:pending'],
+                         revenue=stats['revenue'],
                          recent_orders=recent_orders)
 
 
 @admin_bp.route('/admin/products')
 @admin_required
+@read_replica
 def products():
     """Admin product management page"""
     category = request.args.get('category', '')
@@ -52,7 +72,8 @@ def products():
     if category:
         query = query.filter_by(category=category)
     
-    products = query.order_by(Product.created_at.desc()).all()
+    products = paginate(query, Product.created_at, Product.product_id, get_per_page(),
+                        after=request.args.get('after'), before=request.args.get('before'))
     return render_template('admin/products.html', products=products, category=category)
 
 
@@ -66,12 +87,17 @@ def add_product():
         price = float(request.form.get('price'))
         description = request.form.get('description')
         stock = int(request.form.get('stock', 100))
-        image = request.form.get('image', '')  # For demo, using URL
         
         if not all([name, category, price]):
             flash('Please fill in all required fields', 'error')
             return render_template('admin/add_product.html')
         
+        try:
+            image = _submitted_image()
+        except InvalidImageError as e:
+            flash(str(e), 'error')
+            return render_template('admin/add_product.html')
+        
         product = Product(
             name=name,
             category=category,
@@ -83,7 +109,11 @@ def add_product():
         
         try:
             db.session.add(product)
+            bump('products')
             db.session.commit()
+            get_search_engine().index_product(product)
+            invalidate_product(product.product_id, product.category)
+            purge_pages()
             flash('Product added successfully!', 'success')
             return redirect(url_for('admin.products'))
         except Exception as e:
@@ -100,15 +130,24 @@ def edit_product(product_id):
     product = Product.query.get_or_404(product_id)
     
     if request.method == 'POST':
+        old_category = product.category
         product.name = request.form.get('name')
         product.category = request.form.get('category')
         product.price = float(request.form.get('price'))
         product.description = request.form.get('description')
         product.stock = int(request.form.get('stock', 100))
-        product.image = request.form.get('image', product.image)
+        try:
+            product.image = _submitted_image(product.image)
+        except InvalidImageError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+            return render_template('admin/edit_product.html', product=product)
         
         try:
             db.session.commit()
+            get_search_engine().index_product(product)
+            invalidate_product(product.product_id, old_category, product.category)
+            purge_pages()
             flash('Product updated successfully!', 'success')
             return redirect(url_for('admin.products'))
         except Exception as e:
@@ -123,10 +162,15 @@ def edit_product(product_id):
 def delete_product(product_id):
     """Delete product"""
     product = Product.query.get_or_404(product_id)
+    category = product.category
     
     try:
         db.session.delete(product)
+        bump('products', -1)
         db.session.commit()
+        get_search_engine().remove_product(product_id)
+        invalidate_product(product_id, category)
+        purge_pages()
         flash('Product deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -135,25 +179,97 @@ def delete_product(product_id):
     return redirect(url_for('admin.products'))
 
 
+@admin_bp.route('/admin/products/import', methods=['GET', 'POST'])
+@admin_required
+def import_products():
+    """Bulk import products from an uploaded CSV or JSON Lines file"""
+    result = None
+    
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a file to import', 'error')
+            return render_template('admin/import_products.html')
+        
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+        try:
+            result = product_io.import_products(stream, product_io.detect_format(upload.filename),
+                                                batch_size=current_app.config['IMPORT_BATCH_SIZE'])
+        except UnicodeDecodeError:
+            db.session.rollback()
+            flash('The file must be UTF-8 encoded text', 'error')
+            return render_template('admin/import_products.html')
+        product_io.refresh_after_import()
+        flash(f'Imported {result.upserted} products', 'success')
+    
+    return render_template('admin/import_products.html', result=result)
+
+
+@admin_bp.route('/admin/products/export')
+@admin_required
+@read_replica
+def export_products():
+    """Download the whole catalog as CSV or JSON Lines"""
+    fmt = 'jsonl' if request.args.get('format') == 'jsonl' else 'csv'
+    mimetype = 'application/x-ndjson' if fmt == 'jsonl' else 'text/csv'
+    return Response(stream_with_context(product_io.export_products(fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=products.{fmt}'})
+
+
+@admin_bp.route('/admin/analytics')
+@admin_required
+@read_replica
+def analytics_page():
+    """Sales charts for a date range, read from the analytics rollups"""
+    start, end = analytics.default_range()
+    try:
+        if request.args.get('start'):
+            start = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+        if request.args.get('end'):
+            end = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format', 'error')
+        start, end = analytics.default_range()
+    if start > end:
+        flash('The start date must not be after the end date', 'error')
+        start, end = analytics.default_range()
+    max_days = current_app.config['ANALYTICS_MAX_DAYS']
+    if (end - start).days >= max_days:
+        start = end - timedelta(days=max_days - 1)
+        flash(f'Showing the last {max_days} days of the selected range', 'info')
+    
+    return render_template('admin/analytics.html', start=start, end=end,
+                           daily=analytics.daily_sales(start, end),
+                           categories=analytics.sales_by_category(start, end),
+                           statuses=analytics.orders_by_status(start, end),
+                           top_products=analytics.top_products(start, end,
+                                                               current_app.config['ANALYTICS_TOP_PRODUCTS']))
+
+
 @admin_bp.route('/admin/orders')
 @admin_required
+@read_replica
 def orders():
     """Admin order management page"""
     status = request.args.get('status', '')
-    query = Order.query
+    query = Order.query.options(joinedload(Order.user))
     
     if status:
         query = query.filter_by(status=status)
     
-    orders = query.order_by(Order.order_date.desc()).all()
+    orders = paginate(query, Order.order_date, Order.order_id, get_per_page(),
+                      after=request.args.get('after'), before=request.args.get('before'))
     return render_template('admin/orders.html', orders=orders, status=status)
 
 
 @admin_bp.route('/admin/order/<int:order_id>')
 @admin_required
+@read_replica
 def order_detail(order_id):
     """Admin order detail page"""
-    order = Order.query.get_or_404(order_id)
+    order = (Order.query.options(joinedload(Order.user),
+                                 selectinload(Order.order_items).joinedload(OrderItem.product))
+             .filter_by(order_id=order_id).first_or_404())
     return render_template('admin/order_detail.html', order=order)
 
 
@@ -165,6 +281,8 @@ def update_order_status():
     status = request.form.get('status')
     
     order = Order.query.get_or_404(order_id)
+    record_order_status_change(order, order.status, status)
+    analytics.record_status_change(order, order.status, status)
     order.status = status
     
     try:
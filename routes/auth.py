@@ -5,6 +5,9 @@ Handles user login, signup, and logout
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
 from models import db, User
+from stats import bump
+from passwords import HashingBusyError, needs_rehash
+import cart_store
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -26,8 +29,19 @@ def login():
         
         user = User.query.filter_by(email=email).first()
         
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+            if valid and needs_rehash(user.password):
+                # Upgrade the stored hash to the current algorithm/cost
+                user.set_password(password)
+                db.session.commit()
+        except HashingBusyError:
+            flash('We are experiencing high load. Please try again in a moment.', 'error')
+            return render_template('auth/login.html'), 503
+        
+        if valid:
             login_user(user)
+            cart_store.merge_guest_cart(user.user_id)
             flash('Login successful!', 'success')
             
             # Redirect based on user role
@@ -72,10 +86,15 @@ def signup():
         
         # Create new user
         user = User(name=name, email=email, role='customer')
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except HashingBusyError:
+            flash('We are experiencing high load. Please try again in a moment.', 'error')
+            return render_template('auth/signup.html'), 503
         
         try:
             db.session.add(user)
+            bump('customers')
             db.session.commit()
             flash('Registration successful! Please login.', 'success')
             return redirect(url_for('auth.login'))
@@ -90,6 +109,8 @@ def signup():
 @login_required
 def logout():
     """User logout"""
+    cart_store.flush()
+    cart_store.reset()
     logout_user()
     flash('You have been logged out', 'info')
     return redirect(url_for('user.home'))
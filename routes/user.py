@@ -2,20 +2,38 @@
 User Routes
 Handles homepage, products, cart, checkout, and orders
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, abort
 from flask_login import login_required, current_user
 from models import db, Product, Cart, Order, OrderItem
-from sqlalchemy import func
+from sqlalchemy import func, insert
+from sqlalchemy.orm import joinedload, selectinload
+from db_routing import read_replica
+from http_cache import catalog_page
+from page_cache import cached_page
+from pagination import KeysetPage, paginate, paginate_ranked, get_per_page
+from search import get_search_engine, load_ranked
+from catalog import get_featured, get_product, get_listing, invalidate_stock
+from facets import SORTS, apply_filters, facet_counts, has_refinements, parse_filters, search_matches, sort_for
+from inventory import reserve_stock, OutOfStockError
+from stats import record_order_placed
+from analytics import record_sale
+from outbox import publish
+from cart_summary import compute_cart_summary, clear_cart_summary
+from cart_ops import CartOperationError, cart_payload, validate_operations
+import cart_store
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/')
+@catalog_page
+@cached_page
+@read_replica
 def home():
     """Homepage with categories"""
     # Get featured products from each category
-    food_products = Product.query.filter_by(category='food').limit(4).all()
-    flower_products = Product.query.filter_by(category='flowers').limit(4).all()
-    heritage_products = Product.query.filter_by(category='heritage').limit(4).all()
+    food_products = get_featured('food')
+    flower_products = get_featured('flowers')
+    heritage_products = get_featured('heritage')
     
     return render_template('user/home.html', 
                          food_products=food_products,
@@ -24,114 +42,165 @@ def home():
 
 
 @user_bp.route('/products')
+@catalog_page
+@cached_page
+@read_replica
 def products():
-    """Product listing page with filters"""
-    category = request.args.get('category', '')
+    """Product listing page with filters, sorting and facet counts"""
+    filters = parse_filters(request.args)
+    category = filters['category']
     search = request.args.get('search', '')
     
-    query = Product.query
-    
-    if category:
-        query = query.filter_by(category=category)
+    after = request.args.get('after')
+    before = request.args.get('before')
+    per_page = get_per_page()
     
     if search:
-        query = query.filter(Product.name.like(f'%{search}%'))
-    
-    products = query.all()
+        # Category is filtered after ranking so the category facet can count every match
+        ranked = get_search_engine().search(search, limit=current_app.config['SEARCH_MAX_RESULTS'])
+        matches, facets = search_matches(ranked, filters)
+        products = paginate_ranked(matches, load_ranked, per_page, after=after, before=before)
+    else:
+        facets = facet_counts(filters)
+        query = apply_filters(Product.query, filters)
+        sort_column, descending = sort_for(filters)
+        
+        def load_page():
+            return paginate(query, sort_column, Product.product_id, per_page,
+                            after=after, before=before, descending=descending)
+        
+        if after or before or 'per_page' in request.args or has_refinements(filters):
+            products = load_page()
+        else:
+            # First page at the default size is served from the catalog cache
+            listing = get_listing(category, load_page)
+            products = KeysetPage(listing['items'], next_cursor=listing['next_cursor'],
+                                  per_page=per_page)
     
-    return render_template('user/products.html', products=products, category=category, search=search)
+    return render_template('user/products.html', products=products, category=category, search=search,
+                           filters=filters, facets=facets, sorts=SORTS)
+
+
+@user_bp.route('/search/suggest')
+@catalog_page
+@read_replica
+def search_suggest():
+    """Type-ahead product suggestions as JSON"""
+    term = request.args.get('q', '')
+    category = request.args.get('category', '')
+    ranked = get_search_engine().search(term, category=category or None,
+                                        limit=current_app.config['SEARCH_SUGGESTIONS'])
+    return jsonify([{'product_id': product.product_id, 'name': product.name}
+                    for product in load_ranked(ranked)])
 
 
 @user_bp.route('/product/<int:product_id>')
+@catalog_page
+@cached_page
+@read_replica
 def product_detail(product_id):
     """Product detail page"""
-    product = Product.query.get_or_404(product_id)
+    product = get_product(product_id)
+    if product is None:
+        abort(404)
     return render_template('user/product_detail.html', product=product)
 
 
 @user_bp.route('/add-to-cart', methods=['POST'])
-@login_required
 def add_to_cart():
     """Add product to cart"""
     product_id = request.form.get('product_id')
     quantity = int(request.form.get('quantity', 1))
     
-    product = Product.query.get_or_404(product_id)
-    
-    # Check if item already in cart
-    cart_item = Cart.query.filter_by(user_id=current_user.user_id, product_id=product_id).first()
-    
-    if cart_item:
-        cart_item.quantity += quantity
-    else:
-        cart_item = Cart(user_id=current_user.user_id, product_id=product_id, quantity=quantity)
-        db.session.add(cart_item)
-    
-    db.session.commit()
-    flash(f'{product.name} added to cart!', 'success')
+    try:
+        operations = validate_operations([{'op': 'add', 'product_id': product_id, 'quantity': max(quantity, 1)}], 1)
+        items = cart_store.apply(operations)
+    except CartOperationError as e:
+        if e.index is not None:  # unknown product
+            abort(404)
+        flash(str(e), 'error')
+        return redirect(request.referrer or url_for('user.cart'))
+    cart_payload(cart_store.owner(), items)
+    name = next(item['name'] for item in items if item['product_id'] == operations[0][1])
+    flash(f'{name} added to cart!', 'success')
     return redirect(request.referrer or url_for('user.products'))
 
 
 @user_bp.route('/cart')
-@login_required
 def cart():
     """Shopping cart page"""
-    cart_items = Cart.query.filter_by(user_id=current_user.user_id).all()
-    total = sum(item.product.price * item.quantity for item in cart_items)
+    cart_items = cart_store.get_items()
+    total = cart_payload(cart_store.owner(), cart_items)['subtotal']
     
     return render_template('user/cart.html', cart_items=cart_items, total=total)
 
 
 @user_bp.route('/update-cart', methods=['POST'])
-@login_required
 def update_cart():
     """Update cart item quantity"""
-    cart_id = request.form.get('cart_id')
+    product_id = request.form.get('product_id', type=int)
     quantity = int(request.form.get('quantity', 1))
     
-    cart_item = Cart.query.get_or_404(cart_id)
+    if product_id not in cart_store.get_lines():
+        abort(404)
     
-    if cart_item.user_id != current_user.user_id:
-        flash('Unauthorized access', 'error')
+    try:
+        items = cart_store.apply([('set', product_id, max(quantity, 0))])
+    except CartOperationError:
+        # The product was deleted since it was carted: drop the stale line
+        items = cart_store.apply([('remove', product_id, None)])
+        cart_payload(cart_store.owner(), items)
+        flash('That product is no longer available and was removed from your cart', 'error')
         return redirect(url_for('user.cart'))
-    
-    if quantity <= 0:
-        db.session.delete(cart_item)
-    else:
-        cart_item.quantity = quantity
-    
-    db.session.commit()
+    cart_payload(cart_store.owner(), items)
     flash('Cart updated!', 'success')
     return redirect(url_for('user.cart'))
 
 
-@user_bp.route('/remove-from-cart/<int:cart_id>')
-@login_required
-def remove_from_cart(cart_id):
+@user_bp.route('/remove-from-cart/<int:product_id>')
+def remove_from_cart(product_id):
     """Remove item from cart"""
-    cart_item = Cart.query.get_or_404(cart_id)
-    
-    if cart_item.user_id != current_user.user_id:
-        flash('Unauthorized access', 'error')
-        return redirect(url_for('user.cart'))
-    
-    db.session.delete(cart_item)
-    db.session.commit()
+    items = cart_store.apply([('remove', product_id, None)])
+    cart_payload(cart_store.owner(), items)
     flash('Item removed from cart', 'success')
     return redirect(url_for('user.cart'))
 
 
+@user_bp.route('/api/cart', methods=['GET'])
+def cart_api():
+    """The current visitor's cart as JSON"""
+    return jsonify(cart_payload(cart_store.owner(), cart_store.get_items()))
+
+
+@user_bp.route('/api/cart', methods=['POST'])
+def cart_api_batch():
+    """
+    Apply a batch of cart operations and return the new cart.
+
+    Body: {"operations": [{"op": "add", "product_id": 3, "quantity": 2}, ...]}
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        operations = validate_operations(body.get('operations'), current_app.config['CART_API_MAX_OPERATIONS'])
+        items = cart_store.apply(operations)
+    except CartOperationError as e:
+        return jsonify({'error': str(e), 'index': e.index}), 400
+    return jsonify(cart_payload(cart_store.owner(), items))
+
+
 @user_bp.route('/checkout', methods=['GET', 'POST'])
 @login_required
 def checkout():
     """Checkout page"""
-    cart_items = Cart.query.filter_by(user_id=current_user.user_id).all()
+    cart_store.flush()  # the stored cart is what gets locked and ordered
+    cart_items = (Cart.query.options(joinedload(Cart.product))
+                  .filter_by(user_id=current_user.user_id).all())
     
     if not cart_items:
         flash('Your cart is empty', 'error')
         return redirect(url_for('user.cart'))
     
-    total = sum(item.product.price * item.quantity for item in cart_items)
+    total = compute_cart_summary(current_user.user_id)['subtotal']
     
     if request.method == 'POST':
         payment_method = request.form.get('payment_method')
@@ -142,10 +211,28 @@ def checkout():
             flash('Please fill in all fields', 'error')
             return render_template('user/checkout.html', cart_items=cart_items, total=total)
         
+        # Lock this user's cart lines, then reserve stock at current prices
+        lines = (db.session.query(Cart.product_id, Cart.quantity)
+                 .filter(Cart.user_id == current_user.user_id)
+                 .with_for_update().all())
+        if not lines:
+            # A concurrent submit of this checkout already ordered the cart
+            db.session.rollback()
+            cart_store.reset()
+            clear_cart_summary(current_user.user_id)
+            flash('Your cart is empty', 'error')
+            return redirect(url_for('user.cart'))
+        try:
+            prices = reserve_stock(lines)
+        except OutOfStockError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+            return redirect(url_for('user.cart'))
+        
         # Create order
         order = Order(
             user_id=current_user.user_id,
-            total_amount=total,
+            total_amount=sum(prices[product_id] * quantity for product_id, quantity in lines),
             payment_method=payment_method,
             shipping_address=shipping_address,
             phone=phone,
@@ -154,20 +241,29 @@ def checkout():
         db.session.add(order)
         db.session.flush()  # Get order_id
         
-        # Create order items
-        for cart_item in cart_items:
-            order_item = OrderItem(
-                order_id=order.order_id,
-                product_id=cart_item.product_id,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price
-            )
-            db.session.add(order_item)
+        # Create order items in a single multi-row insert
+        db.session.execute(insert(OrderItem), [
+            {'order_id': order.order_id, 'product_id': product_id,
+             'quantity': quantity, 'price': prices[product_id]}
+            for product_id, quantity in lines
+        ])
         
         # Clear cart
         Cart.query.filter_by(user_id=current_user.user_id).delete()
         
+        record_order_placed(order)
+        record_sale(order, lines, prices, {item.product_id: item.product.category for item in cart_items})
+        publish('order.placed', {
+            'order_id': order.order_id,
+            'user_id': order.user_id,
+            'total_amount': order.total_amount,
+            'items': [{'product_id': product_id, 'quantity': quantity, 'price': prices[product_id]}
+                      for product_id, quantity in lines],
+        }, key=f'order:{order.order_id}')
         db.session.commit()
+        cart_store.reset()
+        clear_cart_summary(current_user.user_id)
+        invalidate_stock(prices)
         
         return redirect(url_for('user.order_confirmation', order_id=order.order_id))
     
@@ -178,7 +274,8 @@ def checkout():
 @login_required
 def order_confirmation(order_id):
     """Order confirmation page"""
-    order = Order.query.get_or_404(order_id)
+    order = (Order.query.options(selectinload(Order.order_items).joinedload(OrderItem.product))
+             .filter_by(order_id=order_id).first_or_404())
     
     if order.user_id != current_user.user_id:
         flash('Unauthorized access', 'error')
@@ -189,7 +286,10 @@ def order_confirmation(order_id):
 
 @user_bp.route('/my-orders')
 @login_required
+@read_replica
 def my_orders():
     """User's order history"""
-    orders = Order.query.filter_by(user_id=current_user.user_id).order_by(Order.order_date.desc()).all()
+    query = Order.query.filter_by(user_id=current_user.user_id)
+    orders = paginate(query, Order.order_date, Order.order_id, get_per_page(),
+                      after=request.args.get('after'), before=request.args.get('before'))
     return render_template('user/my_orders.html', orders=orders)
@@ -0,0 +1,253 @@
+"""
+Product Search
+Ranked full-text search over product name, description and category.
+
+MySQL deployments use the FULLTEXT index on `products`; SQLite and test setups
+fall back to an in-process inverted index. The admin routes update it in
+place and bump a generation key in the shared cache, so the indexes of other
+workers rebuild on their next search; an index is also rebuilt once it is
+SEARCH_INDEX_MAX_AGE seconds old, which covers changes whose generation
+bump other processes can't see (e.g. with the per-process memory cache).
+"""
+import math
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from flask import current_app
+from sqlalchemy import text
+from models import db, Product
+from cache import get_cache
+from db_routing import read_primary
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Relative weight of a term occurrence in each indexed field
+FIELD_WEIGHTS = {'name': 3.0, 'category': 2.0, 'description': 1.0}
+
+# Score multiplier for tokens matched by prefix rather than exactly
+PREFIX_MATCH_WEIGHT = 0.5
+
+# InnoDB ignores tokens shorter than innodb_ft_min_token_size (3 by default)
+FULLTEXT_MIN_TOKEN = 3
+
+GENERATION_KEY = 'search:generation'
+GENERATION_TTL = 365 * 24 * 3600
+
+
+def _current_generation():
+    """The shared search generation, started afresh if the cache has lost it"""
+    cache = get_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        cache.set(GENERATION_KEY, generation, ttl=GENERATION_TTL)
+    return generation
+
+
+def bump_search_generation():
+    """Tell every process's in-memory index that the catalog has changed; returns the new generation"""
+    generation = uuid.uuid4().hex
+    get_cache().set(GENERATION_KEY, generation, ttl=GENERATION_TTL)
+    return generation
+
+
+def tokenize(value):
+    """Split text into lowercase word tokens"""
+    if not value:
+        return []
+    return TOKEN_RE.findall(value.lower())
+
+
+class InMemorySearchIndex:
+    """Inverted index over the product catalog, ranked with TF-IDF and field weights"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}     # token -> {product_id: weighted term frequency}
+        self._documents = {}    # product_id -> (category, set of tokens)
+        self._vocabulary = []   # sorted tokens, rebuilt lazily for prefix lookups
+        self._vocabulary_dirty = False
+        self._loaded = False
+        self._generation = None  # shared generation the index reflects
+        self._loaded_at = 0.0
+
+    def _ensure_current(self):
+        """Build the index, or rebuild it if the catalog changed elsewhere or it has aged out"""
+        generation = _current_generation()
+        max_age = current_app.config['SEARCH_INDEX_MAX_AGE']
+        if (self._loaded and self._generation == generation
+                and time.monotonic() - self._loaded_at < max_age):
+            return
+        with self._lock:
+            if (self._loaded and self._generation == generation
+                    and time.monotonic() - self._loaded_at < max_age):
+                return
+            self._postings, self._documents = {}, {}
+            with read_primary():
+                rows = db.session.query(Product.product_id, Product.name,
+                                        Product.description, Product.category).all()
+            for row in rows:
+                self._add(row.product_id, row.name, row.description, row.category)
+            self._loaded, self._generation, self._loaded_at = True, generation, time.monotonic()
+
+    def _add(self, product_id, name, description, category):
+        weights = {}
+        for field, value in (('name', name), ('description', description), ('category', category)):
+            for token in tokenize(value):
+                weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS[field]
+        for token, weight in weights.items():
+            self._postings.setdefault(token, {})[product_id] = weight
+        self._documents[product_id] = (category, set(weights))
+        self._vocabulary_dirty = True
+
+    def _remove(self, product_id):
+        document = self._documents.pop(product_id, None)
+        if document is None:
+            return
+        for token in document[1]:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+        self._vocabulary_dirty = True
+
+    def _changed(self, product_id, product=None):
+        """Apply one product change here and announce it to the other processes"""
+        with self._lock:
+            previous = get_cache().get(GENERATION_KEY)
+            generation = bump_search_generation()
+            if not self._loaded:
+                return  # the next search builds the index from the database
+            self._remove(product_id)
+            if product is not None:
+                self._add(product_id, product.name, product.description, product.category)
+            # Only skip the rebuild if nothing else changed since this index was built
+            if previous == self._generation:
+                self._generation = generation
+
+    def index_product(self, product):
+        """Add or refresh a single product after it has been created or edited"""
+        self._changed(product.product_id, product)
+
+    def remove_product(self, product_id):
+        """Drop a deleted product from the index"""
+        self._changed(product_id)
+
+    def _expand(self, token, prefix):
+        """Return the indexed tokens matching `token`, as a prefix if requested"""
+        if not prefix:
+            return [token] if token in self._postings else []
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        matches = []
+        for i in range(bisect_left(self._vocabulary, token), len(self._vocabulary)):
+            candidate = self._vocabulary[i]
+            if not candidate.startswith(token):
+                break
+            matches.append(candidate)
+        return matches
+
+    def search(self, query, category=None, limit=None, prefix=True):
+        """
+        Return product ids matching every query term, best match first.
+
+        Terms also match as prefixes ("rose" finds "roses", "choc" finds
+        "chocolate") so partially typed words hit, at a lower score than exact
+        matches.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        self._ensure_current()
+
+        with self._lock:
+            total = len(self._documents) or 1
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for token in self._expand(term, prefix):
+                    postings = self._postings[token]
+                    idf = math.log(1 + total / len(postings))
+                    if token != term:
+                        idf *= PREFIX_MATCH_WEIGHT
+                    for product_id, weight in postings.items():
+                        term_scores[product_id] = term_scores.get(product_id, 0.0) + weight * idf
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pid: score + term_scores[pid]
+                              for pid, score in scores.items() if pid in term_scores}
+                if not scores:
+                    return []
+
+            if category:
+                scores = {pid: score for pid, score in scores.items()
+                          if self._documents[pid][0] == category}
+
+        ranked = sorted(scores, key=lambda pid: (-scores[pid], -pid))
+        return ranked[:limit] if limit else ranked
+
+
+class FullTextSearch:
+    """MySQL FULLTEXT search; InnoDB maintains the index transactionally"""
+
+    MATCH = 'MATCH(name, description, category) AGAINST (:query IN BOOLEAN MODE)'
+
+    def search(self, query, category=None, limit=None, prefix=True):
+        terms = [t for t in tokenize(query) if len(t) >= FULLTEXT_MIN_TOKEN]
+        if not terms:
+            return []
+        suffix = '*' if prefix else ''
+        boolean = ' '.join(f'+{t}{suffix}' for t in terms)
+
+        sql = f'SELECT product_id FROM products WHERE {self.MATCH}'
+        params = {'query': boolean}
+        if category:
+            sql += ' AND category = :category'
+            params['category'] = category
+        sql += f' ORDER BY {self.MATCH} DESC, product_id DESC'
+        if limit:
+            sql += ' LIMIT :limit'
+            params['limit'] = limit
+        return [row[0] for row in db.session.execute(text(sql), params)]
+
+    def index_product(self, product):
+        pass
+
+    def remove_product(self, product_id):
+        pass
+
+
+def get_search_engine():
+    """Return the search backend for the current app, creating it on first use"""
+    engine = current_app.extensions.get('product_search')
+    if engine is None:
+        backend = current_app.config['SEARCH_BACKEND']
+        if backend == 'auto':
+            backend = 'fulltext' if db.engine.dialect.name == 'mysql' else 'memory'
+        engine = FullTextSearch() if backend == 'fulltext' else InMemorySearchIndex()
+        current_app.extensions['product_search'] = engine
+    return engine
+
+
+def reset_search_engine():
+    """
+    Discard the current backend so the next search rebuilds it, e.g. after a
+    bulk import, and bump the shared generation for other processes' indexes.
+    """
+    current_app.extensions.pop('product_search', None)
+    bump_search_generation()
+
+
+def load_ranked(product_ids):
+    """Fetch products by id, preserving the ranking order of `product_ids`"""
+    if not product_ids:
+        return []
+    products = Product.query.filter(Product.product_id.in_(product_ids)).all()
+    by_id = {product.product_id: product for product in products}
+    return [by_id[pid] for pid in product_ids if pid in by_id]
@@ -40,6 +40,101 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
+    // Search type-ahead suggestions
+    const searchInput = document.querySelector('input[data-suggest-url]');
+    if (searchInput) {
+        let suggestTimer = null;
+        searchInput.addEventListener('input', function() {
+            clearTimeout(suggestTimer);
+            const term = this.value.trim();
+            if (term.length < 2) {
+                return;
+            }
+            suggestTimer = setTimeout(function() {
+                const params = new URLSearchParams({ q: term });
+                const category = searchInput.form.querySelector('input[name="category"]');
+                if (category) {
+                    params.set('category', category.value);
+                }
+                fetch(searchInput.dataset.suggestUrl + '?' + params.toString())
+                    .then(function(response) { return response.json(); })
+                    .then(function(suggestions) {
+                        const list = document.getElementById(searchInput.getAttribute('list'));
+                        list.innerHTML = '';
+                        suggestions.forEach(function(suggestion) {
+                            const option = document.createElement('option');
+                            option.value = suggestion.name;
+                            list.appendChild(option);
+                        });
+                    });
+            }, 150);
+        });
+    }
+    
+    // Guest pages may come from the page cache, so a guest with a cart (the has_cart
+    // cookie set by the server) fetches the badge count separately
+    const guestBadge = document.querySelector('#cart-count[data-cart-url]');
+    if (guestBadge && window.fetch && /(?:^|;\s*)has_cart=1(?:;|$)/.test(document.cookie)) {
+        fetch(guestBadge.dataset.cartUrl, { headers: { 'Accept': 'application/json' }, credentials: 'same-origin' })
+            .then(function(response) { return response.ok ? response.json() : null; })
+            .then(function(cart) {
+                if (cart) {
+                    updateCartCount(cart.count);
+                    if (cart.count === 0) {
+                        // The guest cart is gone (e.g. the session expired): stop asking
+                        document.cookie = 'has_cart=; Max-Age=0; path=/';
+                    }
+                }
+            })
+            .catch(function() {});
+    }
+    
+    // Add to cart without leaving the page
+    document.querySelectorAll('form[data-cart-api]').forEach(function(form) {
+        form.addEventListener('submit', function(event) {
+            if (event.defaultPrevented || !window.fetch) {
+                return;
+            }
+            event.preventDefault();
+            const productId = parseInt(form.querySelector('input[name="product_id"]').value);
+            const quantity = parseInt(form.querySelector('input[name="quantity"]').value) || 1;
+            cartApi.queue(form.dataset.cartApi, { op: 'add', product_id: productId, quantity: quantity })
+                .then(function(cart) {
+                    updateCartCount(cart.count);
+                    const item = cart.items.find(function(line) { return line.product_id === productId; });
+                    showMessage((item ? item.name : 'Item') + ' added to cart!', 'success');
+                })
+                .catch(function() { form.submit(); });
+        });
+    });
+    
+    // Cart page: quantity changes and removals go through the cart API
+    const cartTable = document.getElementById('cart-table');
+    if (cartTable && window.fetch) {
+        const apiUrl = cartTable.dataset.cartApi;
+        cartTable.querySelectorAll('.cart-item').forEach(function(row) {
+            const productId = parseInt(row.dataset.productId);
+            row.querySelector('.item-quantity').addEventListener('change', function() {
+                const quantity = parseInt(this.value);
+                if (!(quantity > 0)) {
+                    return;
+                }
+                cartApi.queue(apiUrl, { op: 'set', product_id: productId, quantity: quantity })
+                    .then(renderCart)
+                    .catch(function() { window.location.reload(); });
+            });
+            row.querySelector('.cart-remove').addEventListener('click', function(event) {
+                event.preventDefault();
+                if (!confirm('Remove this item from cart?')) {
+                    return;
+                }
+                cartApi.queue(apiUrl, { op: 'remove', product_id: productId })
+                    .then(renderCart)
+                    .catch(function() { window.location.reload(); });
+            });
+        });
+    }
+    
     // Confirm delete actions
     const deleteLinks = document.querySelectorAll('a[onclick*="confirm"]');
     deleteLinks.forEach(function(link) {
@@ -51,7 +146,7 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
-// Update cart count (if needed for AJAX updates)
+// Update the navbar cart badge
 function updateCartCount(count) {
     const cartCount = document.getElementById('cart-count');
     if (cartCount) {
@@ -59,6 +154,82 @@ function updateCartCount(count) {
     }
 }
 
+// Cart API client: operations queued within a short window go out as one batch request
+const cartApi = {
+    delay: 250,
+    pending: [],
+    timer: null,
+    
+    queue: function(url, operation) {
+        const self = this;
+        return new Promise(function(resolve, reject) {
+            self.pending.push({ operation: operation, resolve: resolve, reject: reject });
+            clearTimeout(self.timer);
+            self.timer = setTimeout(function() { self.flush(url); }, self.delay);
+        });
+    },
+    
+    flush: function(url) {
+        const batch = this.pending;
+        this.pending = [];
+        fetch(url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Accept': 'application/json' },
+            body: JSON.stringify({ operations: batch.map(function(entry) { return entry.operation; }) })
+        })
+            .then(function(response) {
+                return response.json().then(function(body) {
+                    if (!response.ok) {
+                        throw new Error(body.error || 'Cart update failed');
+                    }
+                    return body;
+                });
+            })
+            .then(function(cart) { batch.forEach(function(entry) { entry.resolve(cart); }); })
+            .catch(function(error) { batch.forEach(function(entry) { entry.reject(error); }); });
+    }
+};
+
+// Redraw cart page figures from an API response
+function renderCart(cart) {
+    updateCartCount(cart.count);
+    if (cart.items.length === 0) {
+        window.location.reload();
+        return;
+    }
+    const lines = {};
+    cart.items.forEach(function(item) { lines[item.product_id] = item; });
+    document.querySelectorAll('#cart-table .cart-item').forEach(function(row) {
+        const item = lines[row.dataset.productId];
+        if (!item) {
+            row.remove();
+            return;
+        }
+        row.querySelector('.item-quantity').value = item.quantity;
+        row.querySelector('.line-total').textContent = formatCurrency(item.line_total);
+    });
+    document.getElementById('cart-subtotal').textContent = formatCurrency(cart.subtotal);
+    document.getElementById('cart-total').textContent = formatCurrency(cart.subtotal);
+}
+
+// Show a dismissible message like the server-side flash messages
+function showMessage(message, category) {
+    const alert = document.createElement('div');
+    alert.className = 'alert alert-' + (category === 'error' ? 'danger' : category) + ' alert-dismissible fade show';
+    alert.setAttribute('role', 'alert');
+    alert.textContent = message;
+    const close = document.createElement('button');
+    close.type = 'button';
+    close.className = 'btn-close';
+    close.setAttribute('data-bs-dismiss', 'alert');
+    alert.appendChild(close);
+    const container = document.createElement('div');
+    container.className = 'container mt-3';
+    container.appendChild(alert);
+    document.querySelector('main').prepend(container);
+    setTimeout(function() { bootstrap.Alert.getOrCreateInstance(alert).close(); }, 5000);
+}
+
 // Format currency
 const CURRENCY_SYMBOL = "₹";
 
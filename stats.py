@@ -0,0 +1,94 @@
+"""
+Store Statistics
+Counters behind the admin dashboard, updated in the same transaction as the
+writes they count and periodically reconciled against the source tables.
+
+Each counter is spread over STATS_SHARDS rows; writers bump a random shard so
+concurrent checkouts don't queue on a single hot row, and readers sum them.
+"""
+import random
+from flask import current_app
+from sqlalchemy import func, update
+from models import db, StoreStat, Product, Order, User
+
+ORDER_STATUSES = ('pending', 'confirmed', 'delivered', 'cancelled')
+
+# Orders in these statuses don't count towards revenue
+NON_REVENUE_STATUSES = ('cancelled',)
+
+
+def counter_names():
+    return ['products', 'orders', 'customers', 'revenue'] + [f'orders:{s}' for s in ORDER_STATUSES]
+
+
+def bump(name, delta=1):
+    """
+    Add `delta` to a counter within the current transaction.
+
+    Counter rows are created by reconcile_stats(); a counter that doesn't exist
+    yet is skipped here and picked up by the next reconciliation.
+    """
+    shard = random.randrange(current_app.config['STATS_SHARDS'])
+    db.session.execute(
+        update(StoreStat)
+        .where(StoreStat.name == name, StoreStat.shard == shard)
+        .values(value=StoreStat.value + delta)
+    )
+
+
+def record_order_placed(order):
+    bump('orders')
+    bump(f'orders:{order.status}')
+    if order.status not in NON_REVENUE_STATUSES:
+        bump('revenue', order.total_amount)
+
+
+def record_order_status_change(order, old_status, new_status):
+    if old_status == new_status:
+        return
+    bump(f'orders:{old_status}', -1)
+    bump(f'orders:{new_status}')
+    was_revenue = old_status not in NON_REVENUE_STATUSES
+    is_revenue = new_status not in NON_REVENUE_STATUSES
+    if was_revenue != is_revenue:
+        bump('revenue', order.total_amount if is_revenue else -order.total_amount)
+
+
+def compute_stats():
+    """Recompute every counter from the source tables"""
+    values = dict.fromkeys(counter_names(), 0)
+    values['products'] = db.session.query(func.count(Product.product_id)).scalar()
+    values['customers'] = (db.session.query(func.count(User.user_id))
+                           .filter(User.role == 'customer').scalar())
+    for status, count, total in (db.session.query(Order.status, func.count(Order.order_id),
+                                                  func.coalesce(func.sum(Order.total_amount), 0))
+                                 .group_by(Order.status)):
+        values['orders'] += count
+        values[f'orders:{status}'] = count
+        if status not in NON_REVENUE_STATUSES:
+            values['revenue'] += float(total)
+    return values
+
+
+def reconcile_stats():
+    """Rewrite all counters from the source tables, e.g. from a periodic job"""
+    values = compute_stats()
+    shards = current_app.config['STATS_SHARDS']
+    db.session.query(StoreStat).delete()
+    db.session.add_all(StoreStat(name=name, shard=shard, value=value if shard == 0 else 0)
+                       for name, value in values.items()
+                       for shard in range(shards))
+    db.session.commit()
+    return values
+
+
+def get_stats():
+    """Current counter values, summed across shards"""
+    rows = (db.session.query(StoreStat.name, func.sum(StoreStat.value))
+            .group_by(StoreStat.name).all())
+    if not rows:
+        return reconcile_stats()
+    values = dict.fromkeys(counter_names(), 0)
+    for name, value in rows:
+        values[name] = value if name == 'revenue' else int(value)
+    return values